@@ -1,70 +1,167 @@
 #!/usr/bin/env python3
 
 import sys
+import bisect
+import argparse
 
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
 
 import assets
+import player_model
+import profiling
 
 
-class AgentWidget(QWidget):
-    def __init__(self, editor, player_name, agent_name):
-        super().__init__()
-        self.editor_ = editor
-        self.player_name = player_name
-        self.agent_name = agent_name
+ICON_CELL_SIZE = 40
 
-        self.layout = QHBoxLayout()
-        self.icon_agent = QLabel()
-        self.icon_agent.setPixmap(self.editor_.agent_icons[agent_name])
-        self.checkbox = QCheckBox()
+# Model role for a player's weight for an agent
+WEIGHT_ROLE = Qt.ItemDataRole.UserRole
 
-        self.checkbox.stateChanged.connect(lambda: self.cb_state_changed())
 
-        self.layout.addWidget(self.icon_agent)
-        self.layout.addWidget(self.checkbox)
-        self.layout.setStretch(1, 1)
-        self.setLayout(self.layout)
-
-    # Called when an agent's checkbox is changed
-    def cb_state_changed(self):
-        self.editor_.set_player_agent_availability(
-            self.player_name, self.agent_name, self.get_state())
+# Table of players (rows) by agents (columns), each cell checked if the agent
+# is in the player's pool, with the player's weight for it. Rows come from a
+# sorted index of player names, filtered by prefix; players are only loaded
+# once their row is shown
+class PlayerTableModel(QAbstractTableModel):
+    def __init__(self, editor):
+        super().__init__()
+        self.editor_ = editor
+        self.agent_names = list(self.editor_.schema["agent_pool"])
+
+        # Sorted (case-folded name, name) index, and the rows matching the filter
+        self.name_index = sorted((key.casefold(), key)
+                                 for key in self.editor_.players)
+        self.filter_text = ""
+        self.rows = [name for folded, name in self.name_index]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.agent_names)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        agent_name = self.agent_names[index.column()]
+        if role == Qt.ItemDataRole.CheckStateRole:
+            player = self.editor_.players[self.rows[index.row()]]
+            return Qt.CheckState.Checked if player.has_agent(agent_name) else Qt.CheckState.Unchecked
+        if role == WEIGHT_ROLE:
+            return self.editor_.players[self.rows[index.row()]].get_weight(agent_name)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            weight = self.editor_.players[self.rows[index.row()]].get_weight(agent_name)
+            return agent_name if weight == 1.0 else "%s (weight %g)" % (agent_name, weight)
+
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid():
+            return False
+
+        if role == Qt.ItemDataRole.CheckStateRole:
+            # The default key handling sets the state as a plain int
+            self.editor_.set_player_agent_availability(
+                self.rows[index.row()], self.agent_names[index.column()],
+                Qt.CheckState(value) == Qt.CheckState.Checked)
+        elif role == WEIGHT_ROLE:
+            self.editor_.set_player_agent_weight(
+                self.rows[index.row()], self.agent_names[index.column()], value)
+        else:
+            return False
+
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index):
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsUserCheckable
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Vertical:
+            return self.rows[section] if role == Qt.ItemDataRole.DisplayRole else None
+
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.editor_.agent_icons.get(self.agent_names[section])
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self.agent_names[section]
+
+        return None
+
+    # Shows only players whose name starts with 'text' (case-insensitive)
+    def set_filter(self, text):
+        self.beginResetModel()
+        self.filter_text = text.casefold()
+        self.rows = self.get_matching_names()
+        self.endResetModel()
+
+    def get_matching_names(self):
+        start = bisect.bisect_left(self.name_index, (self.filter_text,))
+        end = start
+        while end < len(self.name_index) and self.name_index[end][0].startswith(self.filter_text):
+            end += 1
+
+        return [name for folded, name in self.name_index[start:end]]
 
-    # Sets the agent's checkbox state
-    def set_state(self, state):
-        self.checkbox.setChecked(state)
+    def add_player(self, player_name):
+        bisect.insort(self.name_index, (player_name.casefold(), player_name))
+        self.set_filter(self.filter_text)
 
-    # Retrieves the agent's checkbox state
-    def get_state(self):
-        return True if self.checkbox.checkState() == Qt.CheckState.Checked else False
+    def remove_player(self, player_name):
+        self.name_index.remove((player_name.casefold(), player_name))
+        self.set_filter(self.filter_text)
 
 
-class PlayerWidget(QWidget):
-    def __init__(self, editor, player_name):
+# Paints each cell as the agent's icon (one shared pixmap per agent), faded
+# out when the agent isn't in the pool, with the weight in the corner if it
+# isn't 1; clicking toggles it, right-clicking asks for a new weight
+class AgentIconDelegate(QStyledItemDelegate):
+    def __init__(self, editor):
         super().__init__()
         self.editor_ = editor
-        self.player_name = player_name
-
-        self.layout = QHBoxLayout()
-        self.layout.setContentsMargins(0, 0, 0, 0)
-        self.label_player = QLabel(self.player_name)
-        self.label_player.setMinimumWidth(100)
-        self.widget_map_agents = {}
 
-        # Add AgentWidget for each agent in the game
-        self.layout.addWidget(self.label_player)
-        for key in self.editor_.players[player_name]["agent_pool"]:
-            self.widget_map_agents[key] = AgentWidget(
-                self.editor_, self.player_name, key)
-            self.layout.addWidget(self.widget_map_agents[key])
-            self.widget_map_agents[key].set_state(
-                self.editor_.players[self.player_name]["agent_pool"][key])
-        self.layout.setStretch(0, 1)
-
-        self.setLayout(self.layout)
+    def paint(self, painter, option, index):
+        agent_name = index.model().agent_names[index.column()]
+        is_checked = index.data(
+            Qt.ItemDataRole.CheckStateRole) == Qt.CheckState.Checked
+        icon = self.editor_.agent_icons[agent_name]
+
+        painter.save()
+        if not is_checked:
+            painter.setOpacity(0.2)
+        painter.drawPixmap(option.rect.x() + (option.rect.width() - icon.width()) // 2,
+                           option.rect.y() + (option.rect.height() - icon.height()) // 2, icon)
+        weight = index.data(WEIGHT_ROLE)
+        if weight != 1.0:
+            painter.drawText(option.rect, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignBottom,
+                             "%g" % weight)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(ICON_CELL_SIZE, ICON_CELL_SIZE)
+
+    def editorEvent(self, event, model, option, index):
+        # Keys (Space/Select toggling the current cell) get the default
+        # handling
+        if event.type() == QEvent.Type.KeyPress:
+            return super().editorEvent(event, model, option, index)
+        if event.type() != QEvent.Type.MouseButtonRelease:
+            return False
+
+        if event.button() == Qt.MouseButton.RightButton:
+            agent_name = model.agent_names[index.column()]
+            weight, is_accepted = QInputDialog.getDouble(
+                option.widget, "Agent weight", "Weight for %s (1 is normal):" % agent_name,
+                index.data(WEIGHT_ROLE), 0.0, player_model.MAX_AGENT_WEIGHT, 2)
+            return is_accepted and model.setData(index, weight, WEIGHT_ROLE)
+        if event.button() != Qt.MouseButton.LeftButton:
+            return False
+
+        is_checked = index.data(
+            Qt.ItemDataRole.CheckStateRole) == Qt.CheckState.Checked
+        return model.setData(index, Qt.CheckState.Unchecked if is_checked else Qt.CheckState.Checked,
+                             Qt.ItemDataRole.CheckStateRole)
 
 
 class MainWindow(QWidget):
@@ -87,23 +184,34 @@ class MainWindow(QWidget):
         self.layout_control.addWidget(self.button_save)
         self.layout_control.setStretch(0, 1)
 
+        self.edit_filter = QLineEdit()
+        self.edit_filter.setPlaceholderText("Filter players...")
+        self.edit_filter.textChanged.connect(self.cb_filter_changed)
+
         # Connect 'on click' signals to callback functions
         self.button_add.clicked.connect(self.cb_button_add)
         self.button_remove.clicked.connect(self.cb_button_remove)
         self.button_save.clicked.connect(self.cb_button_save)
 
-        # Set up the player list
-        self.layout_players = QVBoxLayout()
-        self.layout_players.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.layout_players.setContentsMargins(0, 0, 0, 0)
-        self.widget_map_players = {}
-        for key in self.editor_.players:
-            self.widget_map_players[key] = PlayerWidget(self.editor_, key)
-            self.layout_players.addWidget(self.widget_map_players[key])
+        # Set up the player table (only visible rows are ever painted)
+        self.model_players = PlayerTableModel(self.editor_)
+        self.delegate_agents = AgentIconDelegate(self.editor_)
+        self.table_players = QTableView()
+        self.table_players.setModel(self.model_players)
+        self.table_players.setItemDelegate(self.delegate_agents)
+        self.table_players.setSelectionMode(
+            QAbstractItemView.SelectionMode.NoSelection)
+        self.table_players.setShowGrid(False)
+        for header in [self.table_players.horizontalHeader(), self.table_players.verticalHeader()]:
+            header.setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+            header.setDefaultSectionSize(ICON_CELL_SIZE)
+        self.table_players.verticalHeader().setMinimumWidth(100)
 
         self.layout_main.addLayout(self.layout_control)
-        self.layout_main.addLayout(self.layout_players)
+        self.layout_main.addWidget(self.edit_filter)
+        self.layout_main.addWidget(self.table_players)
         self.setLayout(self.layout_main)
+        self.resize(ICON_CELL_SIZE * (len(self.model_players.agent_names) + 4), 600)
 
         self.setWindowTitle("VALORANT Agent Roulette | Agent Pool Editor")
 
@@ -116,7 +224,7 @@ class MainWindow(QWidget):
             return
 
         self.editor_.add_player(player_name)
-        self.add_player_widget(player_name)
+        self.model_players.add_player(player_name)
 
     # Called when 'Remove' button is clicked
     def cb_button_remove(self):
@@ -127,13 +235,19 @@ class MainWindow(QWidget):
             return
 
         self.editor_.remove_player(player_name)
-        self.remove_player_widget(player_name)
+        self.model_players.remove_player(player_name)
 
-    # Called when 'Save' button is clicked
+    # Called when 'Save' button is clicked -- changes are already stored as
+    # they're made, this exports them to 'players.json' for other tools
     def cb_button_save(self):
-        assets.save_player_data(self.editor_.players, assets.PLAYER_DATA_PATH)
+        assets.save_player_data(
+            self.editor_.players.to_dict(), assets.PLAYER_DATA_PATH)
         self.show_message_box("Info", "Saved!")
 
+    # Called as the filter text is typed
+    def cb_filter_changed(self, text):
+        self.model_players.set_filter(text)
+
     # Shows a message box
     def show_message_box(self, title, message):
         dlg = QMessageBox(self)
@@ -143,53 +257,72 @@ class MainWindow(QWidget):
         dlg.setFixedSize(800, 200)
         dlg.exec()
 
-    # Adds a new player widget
-    def add_player_widget(self, player_name):
-        self.widget_map_players[player_name] = PlayerWidget(
-            self.editor_, player_name)
-        self.layout_players.addWidget(self.widget_map_players[player_name])
-
-    # Removes the specified player widget
-    def remove_player_widget(self, player_name):
-        self.widget_map_players[player_name].hide()
-        self.widget_map_players.pop(player_name)
-
 
 class AgentPoolEditor():
-    def __init__(self):
-        self.players = assets.load_player_data(assets.PLAYER_DATA_PATH)
-        self.schema = assets.load_schema(assets.SCHEMA_PATH)
-        self.agent_icons = assets.load_agent_icons(
-            assets.AGENT_ICON_DATA_PATH, 32, 32)
+    def __init__(self, profiler=None):
+        self.profiler = profiler if profiler else profiling.Profiler(False)
+
+        with self.profiler.phase("load_player_data"):
+            self.players = assets.load_player_store()
+        with self.profiler.phase("load_schema"):
+            self.schema = assets.load_schema(assets.SCHEMA_PATH)
+        with self.profiler.phase("load_agent_icons"):
+            self.agent_icons = assets.load_agent_icons(
+                assets.AGENT_ICON_DATA_PATH, 32, 32)
 
     # Adds a player to the player list
     def add_player(self, player_name):
-        self.players[player_name] = self.schema.copy()
+        self.players.add_player(
+            player_name, player_model.player_from_dict(self.schema))
 
     # Removes a player from the player list
     def remove_player(self, player_name):
         if not player_name in self.players:
             return
 
-        self.players.pop(player_name)
+        self.players.remove_player(player_name)
 
     # Sets the availability of a player's agent
     def set_player_agent_availability(self, player_name, agent_name, state):
         if not player_name in self.players:
             return
-        if not agent_name in self.players[player_name]["agent_pool"]:
+        if not agent_name in self.schema["agent_pool"]:
+            return
+        if self.players[player_name].has_agent(agent_name) == state:
+            return
+
+        self.players.set_agent_availability(player_name, agent_name, state)
+
+    # Sets how likely a player is to roll an agent, relative to 1
+    def set_player_agent_weight(self, player_name, agent_name, weight):
+        if not player_name in self.players:
+            return
+        if not agent_name in self.schema["agent_pool"]:
+            return
+        if self.players[player_name].get_weight(agent_name) == player_model.clamp_weight(weight):
             return
 
-        self.players[player_name]["agent_pool"][agent_name] = state
+        self.players.set_agent_weight(player_name, agent_name, weight)
 
 
 def main():
-    app = QApplication(sys.argv)
-    editor = AgentPoolEditor()
-    window = MainWindow(editor)
-
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", nargs="?", const="-", metavar="PATH",
+                        help="write a JSON timing report to PATH (default: stdout) on exit")
+    args, qt_args = parser.parse_known_args()
+
+    profiler = profiling.Profiler(args.profile is not None)
+    app = QApplication(sys.argv[:1] + qt_args)
+    editor = AgentPoolEditor(profiler)
+    with profiler.phase("MainWindow"):
+        window = MainWindow(editor)
+
+    profiler.watch_first_paint(window)
     window.show()
-    sys.exit(app.exec())
+    exit_code = app.exec()
+
+    profiler.save_report(args.profile)
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
@@ -1,38 +1,61 @@
 import json
 import os
+import time
 
-from PyQt6.QtCore import *
-from PyQt6.QtMultimedia import QSoundEffect
-from PyQt6.QtGui import QPixmap
+import player_model
+import player_store
+
+# Qt-free data files (players, schema, weapons, comps). Icons and sounds live
+# in media.py, which needs Qt -- its names can still be reached through this
+# module, and it's only imported the first time one is used
 
 PLAYER_DATA_PATH = "./players.json"
+PLAYER_STORE_PATH = "./players.db"
 SCHEMA_PATH = "./schema.json"
 AGENT_ICON_DATA_PATH = "./icons.json"
 WEAPON_DATA_PATH = "./weapons.json"
-CLICK_SOUND_PATH = "./res/click.wav"
+COMP_DATA_PATH = "./comps.json"
+JOURNAL_PATH = "./journal"
+HISTORY_PATH = "./history"
 
 
+# Returns players.json as {name: player_model.Player}
 def load_player_data(path):
     player_data = {}
+    player_model.load_agents(SCHEMA_PATH)
 
     # Create empty 'players.json' if it doesn't exist
     if not os.path.exists(path):
         save_player_data(player_data, path)
 
     player_data_file = open(path, "r")
-    player_data = json.load(player_data_file)
+    player_data = player_model.players_from_dict(json.load(player_data_file))
     player_data_file.close()
 
     return player_data
 
 
+# Writes to a temp file and swaps it in, so a crash mid-write never leaves a
+# half-written file behind
 def save_player_data(player_data, path):
     output_str = ""
 
-    player_data_file = open(path, "w")
-    output_str = json.dumps(player_data, indent=4, sort_keys=True)
+    temp_path = path + ".tmp"
+    player_data_file = open(temp_path, "w")
+    output_str = json.dumps(player_model.players_to_dict(
+        player_data), indent=4, sort_keys=True)
     player_data_file.write(output_str)
+    player_data_file.flush()
+    os.fsync(player_data_file.fileno())
     player_data_file.close()
+    os.replace(temp_path, path)
+
+
+# Opens the player store, importing 'players.json' when it's first created
+# (see player_store.PlayerStore for 'is_read_only')
+def load_player_store(is_read_only=False):
+    player_model.load_agents(SCHEMA_PATH)
+    return player_store.PlayerStore(PLAYER_STORE_PATH, PLAYER_DATA_PATH, is_read_only)
 
 
 def load_schema(path):
@@ -45,35 +68,19 @@ def load_schema(path):
     return schema
 
 
-def load_agent_icons(path, width, height):
-    agent_icons = {}
-    agent_icon_paths = {}
-
-    agent_icons_file = open(path, "r")
-    agent_icon_paths = json.load(agent_icons_file)
-    agent_icons_file.close()
-
-    for key in agent_icon_paths["agents"]:
-        agent_icons[key] = QPixmap(agent_icon_paths["agents"][key]).scaled(
-            width, height, transformMode=Qt.TransformationMode.SmoothTransformation)
-
-    return agent_icons
+# Returns a new journal file path for a session
+def get_session_journal_path(seed):
+    return os.path.join(JOURNAL_PATH, "%s-%016x.vrj" % (time.strftime("%Y%m%d-%H%M%S"), seed))
 
 
-def load_weapon_icons(path):
-    weapon_icons = {}
-    weapon_icon_paths = {}
+def load_icon_paths(path):
+    icon_paths = {}
 
-    agent_icons_file = open(path, "r")
-    weapon_icon_paths = json.load(agent_icons_file)
-    agent_icons_file.close()
+    icon_paths_file = open(path, "r")
+    icon_paths = json.load(icon_paths_file)
+    icon_paths_file.close()
 
-    for key in weapon_icon_paths["weapons"]:
-        icon = QPixmap(weapon_icon_paths["weapons"][key])
-        weapon_icons[key] = icon.scaled(icon.width(
-        ), 125, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-
-    return weapon_icons
+    return icon_paths
 
 
 def load_weapons(path):
@@ -86,12 +93,31 @@ def load_weapons(path):
     return weapons
 
 
-def load_sounds():
-    sounds = {}
+def load_comps(path):
+    comps = {}
+
+    comps_file = open(path, 'r')
+    comps = json.load(comps_file)
+    comps_file.close()
+
+    return comps
+
+
+MEDIA_NAMES = {
+    "CLICK_SOUND_PATH", "ICON_CACHE_PATH", "ICON_CACHE_HEADER", "ICON_CACHE_MAGIC",
+    "ICON_ATLAS_PATH", "ICON_ATLAS_HEADER", "ICON_ATLAS_MAGIC",
+    "load_agent_icons", "load_weapon_icons", "load_icon", "load_scaled_icon",
+    "load_scaled_image", "read_cached_icon", "write_cached_icon", "IconAtlas",
+    "get_icon_atlas_key", "get_icon_atlas", "load_icon_atlas", "save_icon_atlas",
+    "IconLoader", "VoicePool", "load_sounds",
+}
+
 
-    sounds["click"] = QSoundEffect()
-    sounds["click"].setSource(
-        QUrl.fromLocalFile(CLICK_SOUND_PATH))
-    sounds["click"].setVolume(0.25)
+# Looks up media names (e.g. assets.load_sounds) in media.py, importing it
+# (and Qt) on first use
+def __getattr__(name):
+    if not name in MEDIA_NAMES:
+        raise AttributeError("module 'assets' has no attribute '%s'" % name)
 
-    return sounds
+    import media
+    return getattr(media, name)
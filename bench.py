@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+
+import assets
+import player_model
+import roulette_engine
+
+PLAYER_COUNTS = [10, 1000, 50000]
+AGENT_COUNTS = [25, 200]
+
+# Datasets with more agent pool entries (players x agents) than this are
+# skipped unless --max-entries is raised
+MAX_ENTRIES = 2000000
+
+REPO_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+# Calls 'function' in batches of 'batch' calls for at least 'min_seconds' (and
+# 'min_batches' batches). Returns per-call timings in microseconds
+def measure(function, batch=1, min_seconds=0.2, min_batches=3):
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < min_batches or time.perf_counter() - start < min_seconds:
+        batch_start = time.perf_counter()
+        for i in range(batch):
+            function()
+        samples.append((time.perf_counter() - batch_start) / batch * 1e6)
+
+    return {
+        "calls": len(samples) * batch,
+        "median_us": statistics.median(samples),
+        "mean_us": statistics.mean(samples),
+        "min_us": min(samples),
+    }
+
+
+# Writes a generated dataset to 'path': players.json with 'player_count'
+# players over 'agent_count' agents (each agent in ~70% of pools), plus the
+# repo's weapons, comps and click sound. Icons are generated by the GUI
+# benchmarks, which need Qt
+def generate_dataset(path, player_count, agent_count, seed):
+    rng = random.Random(seed)
+    agent_names = ["Agent%03d" % i for i in range(agent_count)]
+
+    players = {}
+    for i in range(player_count):
+        player = player_model.Player()
+        for agent_name in agent_names:
+            player.set_agent(agent_name, rng.random() < 0.7)
+        players["player%05d" % i] = player
+    assets.save_player_data(players, os.path.join(path, "players.json"))
+
+    for file_name in ["weapons.json", "comps.json"]:
+        shutil.copy(os.path.join(REPO_PATH, file_name),
+                    os.path.join(path, file_name))
+    os.makedirs(os.path.join(path, "res"), exist_ok=True)
+    shutil.copy(os.path.join(REPO_PATH, "res", "click.wav"),
+                os.path.join(path, "res", "click.wav"))
+
+    return agent_names
+
+
+# Selection: a lobby of 5 random players over the generated players.json
+def bench_selection(results, rng):
+    players = assets.load_player_data(assets.PLAYER_DATA_PATH)
+    engine = roulette_engine.RouletteEngine(players, rng.getrandbits(64))
+    lobby = rng.sample(sorted(players), min(roulette_engine.LOBBY_SIZE, len(players)))
+    for player_name in lobby:
+        engine.add_player_to_lobby(player_name)
+    outsiders = [key for key in players if not key in engine.current_lobby]
+    outsider = outsiders[0] if len(outsiders) > 0 else lobby[0]
+    agent_names = player_model.AGENTS.get_names(players[lobby[0]].listed)
+
+    results["get_random_agent"] = measure(
+        lambda: engine.get_random_agent(lobby[0]), batch=100)
+    results["get_random_agent_outside_lobby"] = measure(
+        lambda: engine.get_random_agent(outsider), batch=10)
+    results["get_player_agent_weights"] = measure(
+        lambda: engine.get_player_agent_weights(lobby[0]), batch=10)
+
+    # An agent being taken and freed again, reweighing every lobby sampler
+    def take_free_agent():
+        engine.take_agent(agent_names[0])
+        engine.free_agent(agent_names[0])
+    results["take_free_agent"] = measure(take_free_agent, batch=100)
+    results["is_agent_taken"] = measure(
+        lambda: engine.is_agent_taken(agent_names[-1]), batch=1000)
+    results["solve_lobby"] = measure(engine.solve_lobby, batch=1)
+
+
+def bench_player_data(results):
+    players = assets.load_player_data(assets.PLAYER_DATA_PATH)
+
+    results["load_player_data"] = measure(
+        lambda: assets.load_player_data(assets.PLAYER_DATA_PATH), min_seconds=0)
+    results["save_player_data"] = measure(
+        lambda: assets.save_player_data(players, "players.bench.json"), min_seconds=0)
+    os.remove("players.bench.json")
+
+
+# Icons and lobby updates, offscreen
+def bench_gui(results, agent_names, rng):
+    from PyQt6.QtCore import QEventLoop
+    from PyQt6.QtGui import QImage, QColor
+    from PyQt6.QtWidgets import QApplication
+    import media
+    import roulette_gui
+
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv[:1])
+
+    # One generated PNG per agent and weapon
+    weapons = assets.load_weapons(assets.WEAPON_DATA_PATH)
+    icon_paths = {"agents": {}, "weapons": {}}
+    for kind, names in [("agents", agent_names), ("weapons", weapons["primary"] + weapons["sidearm"])]:
+        for name in names:
+            path = os.path.join("res", "%s-%s.png" % (kind, name))
+            image = QImage(256, 256, QImage.Format.Format_ARGB32)
+            image.fill(QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            image.save(path)
+            icon_paths[kind][name] = path
+    icon_file = open(assets.AGENT_ICON_DATA_PATH, "w")
+    json.dump(icon_paths, icon_file)
+    icon_file.close()
+
+    # Cold: decode and scale every icon, filling the cache. Warm: from the cache
+    def load_agent_icons_cold():
+        shutil.rmtree(media.ICON_CACHE_PATH, ignore_errors=True)
+        assets.load_agent_icons(assets.AGENT_ICON_DATA_PATH, 125, 125)
+
+    results["load_agent_icons_cold"] = measure(
+        load_agent_icons_cold, min_seconds=0)
+    results["load_agent_icons_warm"] = measure(
+        lambda: assets.load_agent_icons(assets.AGENT_ICON_DATA_PATH, 125, 125), min_seconds=0)
+    results["load_weapon_icons_warm"] = measure(
+        lambda: assets.load_weapon_icons(assets.AGENT_ICON_DATA_PATH), min_seconds=0)
+
+    # Every agent and weapon icon, cold, serially on this thread vs through
+    # the background IconLoader (until the last one arrives)
+    def load_icons_serial_cold():
+        shutil.rmtree(media.ICON_CACHE_PATH, ignore_errors=True)
+        assets.load_agent_icons(assets.AGENT_ICON_DATA_PATH, 125, 125)
+        assets.load_weapon_icons(assets.AGENT_ICON_DATA_PATH)
+
+    def load_icons_background_cold():
+        shutil.rmtree(media.ICON_CACHE_PATH, ignore_errors=True)
+        loader = media.IconLoader()
+        for kind, width, height in [("agents", 125, 125), ("weapons", 0, 125)]:
+            for name in icon_paths[kind]:
+                loader.request((kind, name), icon_paths[kind][name], width, height)
+        while loader.is_loading():
+            app.processEvents(QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+        loader.stop()
+
+    results["load_icons_serial_cold"] = measure(
+        load_icons_serial_cold, min_seconds=0)
+    results["load_icons_background_cold"] = measure(
+        load_icons_background_cold, min_seconds=0)
+
+    # Lobby rows rebinding as players are added and cleared
+    vr = roulette_gui.ValoRoulette(journal_path=os.devnull, is_muted=True)
+    window = roulette_gui.MainWindow(vr)
+    lobby = window.widget_lobby
+    player_names = vr.players.keys()
+    samples = []
+
+    def add_clear_cycle():
+        for player_name in rng.sample(player_names, min(roulette_engine.LOBBY_SIZE, len(player_names))):
+            vr.add_player_to_lobby(player_name)
+            start = time.perf_counter()
+            lobby.update_lobby_widget()
+            samples.append(time.perf_counter() - start)
+        vr.clear_lobby()
+        start = time.perf_counter()
+        lobby.update_lobby_widget()
+        samples.append(time.perf_counter() - start)
+
+    measure(add_clear_cycle, min_seconds=0.5)
+    samples = [sample * 1e6 for sample in samples]
+    results["update_lobby_widget"] = {
+        "calls": len(samples),
+        "median_us": statistics.median(samples),
+        "mean_us": statistics.mean(samples),
+        "min_us": min(samples),
+    }
+
+    window.close()
+    vr.close()
+
+
+def run_dataset(player_count, agent_count, args):
+    results = {}
+    rng = random.Random(args.seed)
+    previous_path = os.getcwd()
+    path = tempfile.mkdtemp(prefix="valo-bench-")
+    try:
+        os.chdir(path)
+        agent_names = generate_dataset(
+            path, player_count, agent_count, args.seed)
+        bench_selection(results, rng)
+        bench_player_data(results)
+        if not args.no_gui:
+            bench_gui(results, agent_names, rng)
+    finally:
+        os.chdir(previous_path)
+        shutil.rmtree(path, ignore_errors=True)
+
+    return results
+
+
+# Compares results against a baseline report. Returns a list of benchmarks
+# whose fastest batch got slower by more than 'threshold' (e.g. 0.2 for 20%).
+# The minimum is compared rather than the median since it's far less affected
+# by whatever else the machine is doing
+def compare(report, baseline, threshold):
+    comparison = {}
+    regressions = []
+    for dataset in report["results"]:
+        if not dataset in baseline["results"]:
+            continue
+
+        for name in report["results"][dataset]:
+            if not name in baseline["results"][dataset]:
+                continue
+
+            before = baseline["results"][dataset][name]["min_us"]
+            after = report["results"][dataset][name]["min_us"]
+            ratio = after / before if before > 0 else 1.0
+            comparison["%s/%s" % (dataset, name)] = ratio
+            if ratio > 1 + threshold:
+                regressions.append("%s/%s" % (dataset, name))
+
+    report["comparison"] = {
+        "baseline": baseline.get("created"),
+        "threshold": threshold,
+        "ratios": comparison,
+        "regressions": regressions,
+    }
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", default=",".join(str(count) for count in PLAYER_COUNTS),
+                        help="comma-separated player counts (default: %(default)s)")
+    parser.add_argument("--agents", default=",".join(str(count) for count in AGENT_COUNTS),
+                        help="comma-separated agent counts (default: %(default)s)")
+    parser.add_argument("--max-entries", type=int, default=MAX_ENTRIES,
+                        help="skip datasets with more players x agents (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-gui", action="store_true",
+                        help="skip the icon and lobby widget benchmarks (no Qt)")
+    parser.add_argument("--output", metavar="PATH",
+                        help="write the JSON report to PATH (default: stdout)")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="compare against an earlier report, exit non-zero on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="slowdown that counts as a regression (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # GUI benchmarks never open a window
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": {},
+        "skipped": [],
+    }
+    for player_count in [int(count) for count in args.players.split(",")]:
+        for agent_count in [int(count) for count in args.agents.split(",")]:
+            dataset = "%dp-%da" % (player_count, agent_count)
+            if player_count * agent_count > args.max_entries:
+                report["skipped"].append(dataset)
+                continue
+
+            print("Running %s..." % dataset, file=sys.stderr)
+            report["results"][dataset] = run_dataset(
+                player_count, agent_count, args)
+
+    regressions = []
+    if args.baseline is not None:
+        baseline_file = open(args.baseline, "r")
+        baseline = json.load(baseline_file)
+        baseline_file.close()
+        regressions = compare(report, baseline, args.threshold)
+
+    output_str = json.dumps(report, indent=4)
+    if args.output is None:
+        print(output_str)
+    else:
+        output_file = open(args.output, "w")
+        output_file.write(output_str)
+        output_file.close()
+
+    if len(regressions) > 0:
+        print("Regressions: %s" % ", ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
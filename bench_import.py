@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Modules headless rolls and other data-only tools rely on -- none may load Qt
+DATA_MODULES = ["assets", "player_model", "player_store", "roulette_engine", "weighted_sampler",
+                "comp_engine", "loadout", "history", "headless"]
+
+# Run in a fresh interpreter, so nothing is imported already
+IMPORT_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+for name in %r:
+    __import__(name)
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds,
+                  "qt_modules": sorted(name for name in sys.modules if name.startswith("PyQt6"))}))
+"""
+
+
+# Times importing the data-only modules, fails if it's over budget or any of
+# them pulls in Qt
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10,
+                        help="number of fresh interpreters to time (default: 10)")
+    parser.add_argument("--budget-ms", type=float, default=30.0,
+                        help="fail if the median import time is over this (default: 30)")
+    args = parser.parse_args()
+
+    samples = []
+    qt_modules = set()
+    for i in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT % DATA_MODULES],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output)
+        samples.append(result["seconds"] * 1000)
+        qt_modules.update(result["qt_modules"])
+
+    median = statistics.median(samples)
+    print(json.dumps({
+        "modules": DATA_MODULES,
+        "runs": args.runs,
+        "median_ms": median,
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+        "budget_ms": args.budget_ms,
+        "qt_modules": sorted(qt_modules),
+    }, indent=4))
+
+    if len(qt_modules) > 0:
+        print("Data-only modules imported Qt", file=sys.stderr)
+        sys.exit(1)
+    if median > args.budget_ms:
+        print("Import time over budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
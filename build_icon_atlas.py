@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+import assets
+
+# Icon sizes used by the roulette (agents, weapons) and the agent pool editor
+AGENT_ICON_SIZES = [(125, 125), (32, 32)]
+WEAPON_ICON_SIZES = [(0, 125)]
+
+
+def main():
+    icons = []
+
+    icon_paths = assets.load_icon_paths(assets.AGENT_ICON_DATA_PATH)
+
+    for key in icon_paths["agents"]:
+        for width, height in AGENT_ICON_SIZES:
+            icons.append((icon_paths["agents"][key], width, height))
+    for key in icon_paths["weapons"]:
+        for width, height in WEAPON_ICON_SIZES:
+            icons.append((icon_paths["weapons"][key], width, height))
+
+    assets.save_icon_atlas(icons, assets.ICON_ATLAS_PATH)
+    print("Packed %d icons into %s" % (len(icons), assets.ICON_ATLAS_PATH))
+
+
+if __name__ == "__main__":
+    main()
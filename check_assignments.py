@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import math
+import random
+import argparse
+import itertools
+import collections
+
+import player_model
+import roulette_engine
+
+# Weights players get for agents in generated lobbies (mostly normal)
+TEST_WEIGHTS = [0.0, 0.5, 1.0, 1.0, 1.0, 1.0, 2.5, 4.0]
+
+# Least number of times an assignment is expected to be drawn to get its own
+# cell in the chi-squared check
+MIN_EXPECTED = 5
+
+
+# Returns an engine with a random lobby of up to LOBBY_SIZE players drawn from
+# 'agent_count' agents, with random pools, weights and Dealer's Choice
+def create_lobby(rng, agent_count, seed):
+    agent_names = ["Agent %d" % i for i in range(agent_count)]
+    players = {}
+    for i in range(rng.randint(1, roulette_engine.LOBBY_SIZE)):
+        player = player_model.Player()
+        for agent_name in agent_names:
+            if rng.random() < 0.5:
+                player.set_agent(agent_name, True)
+                player.set_weight(agent_name, rng.choice(TEST_WEIGHTS))
+        if rng.random() < 0.2:
+            player.selected = "Dealer"
+        players["player %d" % i] = player
+
+    engine = roulette_engine.RouletteEngine(players, seed)
+    engine.is_dealers_choice_enabled = rng.random() < 0.7
+    for player_name in players:
+        engine.add_player_to_lobby(player_name)
+
+    return engine
+
+
+# Returns {assignment: weight} for every valid assignment of the engine's
+# lobby, by trying every combination of each player's agents and Dealer's
+# Choice
+def enumerate_assignments(engine):
+    options = []
+    for player_name in engine.current_lobby:
+        special_units = engine.get_special_units(player_name)
+        player_options = []
+        for agent_name in engine.players[player_name].get_agent_names():
+            player_options.append((agent_name, special_units.get(
+                engine.agents.ids[agent_name], roulette_engine.AGENT_UNITS)))
+        if engine.is_dealer_allowed(player_name):
+            player_options.append(("Dealer", roulette_engine.DEALER_UNITS))
+        options.append(player_options)
+
+    assignments = {}
+    for combination in itertools.product(*options):
+        agent_names = [agent_name for agent_name, units in combination if agent_name != "Dealer"]
+        if len(set(agent_names)) != len(agent_names):
+            continue
+
+        weight = 1
+        for agent_name, units in combination:
+            weight *= units
+        if weight > 0:
+            assignments[tuple(agent_name for agent_name, units in combination)] = weight
+
+    return assignments
+
+
+# Returns count_assignments for the engine's lobby, at the engine's own units
+def count_lobby(engine):
+    pools = []
+    dealer_allowed = []
+    special_units = []
+    for player_name in engine.current_lobby:
+        pools.append(engine.players[player_name].pool)
+        dealer_allowed.append(engine.is_dealer_allowed(player_name))
+        player_units = {}
+        for agent_id, units in engine.get_special_units(player_name).items():
+            player_units[units] = player_units.get(units, 0) | 1 << agent_id
+        special_units.append(player_units)
+
+    return engine.count_assignments(pools, dealer_allowed, special_units=special_units)
+
+
+# Checks count_assignments and solve_lobby against brute-force enumeration over
+# random small lobbies: counts must match exactly, and solved assignments must
+# be valid and come up in proportion to their weight
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lobbies", type=int, default=500,
+                        help="random lobbies to count (default: 500)")
+    parser.add_argument("--agents", type=int, default=7,
+                        help="agents to draw pools from (default: 7)")
+    parser.add_argument("--solve-lobbies", type=int, default=5,
+                        help="lobbies to also sample solve_lobby on (default: 5)")
+    parser.add_argument("--samples", type=int, default=10000,
+                        help="solve_lobby draws per sampled lobby (default: 10000)")
+    parser.add_argument("--max-z", type=float, default=4.0,
+                        help="fail if a sampled lobby's chi-squared statistic is more than "
+                             "this many standard deviations over its mean (default: 4)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    count_mismatches = 0
+    infeasible = 0
+    for i in range(args.lobbies):
+        engine = create_lobby(rng, args.agents, args.seed + i)
+        assignments = enumerate_assignments(engine)
+        if count_lobby(engine) != sum(assignments.values()):
+            count_mismatches += 1
+        if len(assignments) == 0:
+            infeasible += 1
+            if engine.solve_lobby() is not None:
+                count_mismatches += 1
+
+    # Chi-squared statistic of solve_lobby's draws against the exact
+    # distribution, as standard deviations over what it averages if they match
+    # (assignments expected under MIN_EXPECTED times are pooled into one
+    # cell), plus draws that aren't valid assignments at all
+    scores = []
+    invalid = 0
+    for i in range(args.solve_lobbies):
+        engine = create_lobby(rng, args.agents, args.seed + args.lobbies + i)
+        assignments = enumerate_assignments(engine)
+        if len(assignments) == 0:
+            continue
+
+        total = sum(assignments.values())
+        drawn = collections.Counter(
+            tuple(engine.solve_lobby().values()) for j in range(args.samples))
+        invalid += sum(drawn[key] for key in drawn if not key in assignments)
+
+        cells = [[0, 0.0]]
+        for key in assignments:
+            expected = args.samples * assignments[key] / total
+            if expected < MIN_EXPECTED:
+                cells[0][0] += drawn[key]
+                cells[0][1] += expected
+            else:
+                cells.append([drawn[key], expected])
+        if cells[0][1] == 0:
+            del cells[0]
+        if len(cells) < 2:
+            continue
+        statistic = sum((observed - expected) ** 2 / expected for observed, expected in cells)
+        freedom = len(cells) - 1
+        scores.append((statistic - freedom) / math.sqrt(2 * freedom))
+
+    print(json.dumps({
+        "lobbies": args.lobbies,
+        "infeasible_lobbies": infeasible,
+        "count_mismatches": count_mismatches,
+        "sampled_lobbies": len(scores),
+        "invalid_draws": invalid,
+        "max_z": max(scores, default=0.0),
+    }, indent=4))
+
+    if count_mismatches > 0 or invalid > 0:
+        print("Assignments don't match brute force", file=sys.stderr)
+        sys.exit(1)
+    if max(scores, default=0.0) > args.max_z:
+        print("solve_lobby draws are off the exact distribution", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import random
+import heapq
+
+import roulette_engine
+
+MAX_COMPS = 64
+
+
+# Scores team compositions for a map from comps.json: every agent has a
+# per-map score, and every role scores by how many players are on it. Finds
+# the best-scoring comps a lobby can field from their agent pools
+class CompEngine:
+    def __init__(self, comp_data):
+        self.tolerance = comp_data["tolerance"]
+        self.roles = []
+        for key in comp_data["role_scores"]:
+            self.roles.append(key)
+        self.agent_roles = {}
+        for key in comp_data["roles"]:
+            self.agent_roles[key] = self.roles.index(comp_data["roles"][key])
+
+        # Per-map scoring tables
+        self.maps = []
+        self.agent_scores = {}
+        self.role_scores = {}
+        self.best_role_scores = {}
+        for key in comp_data["maps"]:
+            role_scores = comp_data["maps"][key].get(
+                "role_scores", comp_data["role_scores"])
+
+            self.maps.append(key)
+            self.agent_scores[key] = comp_data["maps"][key]["agents"]
+            self.role_scores[key] = [role_scores[role] for role in self.roles]
+            self.best_role_scores[key] = {}
+            self.get_best_role_score(
+                key, (0,) * len(self.roles), roulette_engine.LOBBY_SIZE)
+
+    # Role score of a comp with 'counts' players on each role
+    def get_role_score(self, map_name, counts):
+        score = 0
+        for i in range(len(counts)):
+            score += self.role_scores[map_name][i][counts[i]]
+
+        return score
+
+    # Best role score reachable from 'counts' with 'remaining' more players
+    # (who may also pick agents without a role). Memoised per map
+    def get_best_role_score(self, map_name, counts, remaining):
+        key = (counts, remaining)
+        if key in self.best_role_scores[map_name]:
+            return self.best_role_scores[map_name][key]
+
+        if remaining == 0:
+            best = self.get_role_score(map_name, counts)
+        else:
+            best = self.get_best_role_score(map_name, counts, remaining - 1)
+            for i in range(len(counts)):
+                next_counts = counts[:i] + (counts[i] + 1,) + counts[i + 1:]
+                best = max(best, self.get_best_role_score(
+                    map_name, next_counts, remaining - 1))
+
+        self.best_role_scores[map_name][key] = best
+        return best
+
+    # Scores one comp (a list of agent names)
+    def get_comp_score(self, map_name, comp):
+        counts = [0] * len(self.roles)
+        score = 0
+        for agent_name in comp:
+            score += self.agent_scores[map_name].get(agent_name, 0)
+            if agent_name in self.agent_roles:
+                counts[self.agent_roles[agent_name]] += 1
+
+        return score + self.get_role_score(map_name, tuple(counts))
+
+    # Branch-and-bound search over every set of distinct agents the players
+    # (whose agent pools are lists of agent names, in lobby order) can field.
+    # Scores don't depend on who plays which agent, so sets are searched
+    # rather than per-player assignments. Returns up to MAX_COMPS
+    # (score, agents) pairs within 'tolerance' of the best score, best first.
+    # Equal-scoring agents are tried in random order, so ties don't always
+    # favour the same comps
+    def search(self, map_name, pools, rng=random):
+        agent_scores = self.agent_scores[map_name]
+        num_players = len(pools)
+
+        # Which players can play each agent
+        holders = {}
+        for i in range(num_players):
+            for agent_name in pools[i]:
+                holders[agent_name] = holders.get(agent_name, 0) | (1 << i)
+
+        # Best agents first
+        agents = list(holders)
+        rng.shuffle(agents)
+        agents.sort(key=lambda agent_name: agent_scores.get(
+            agent_name, 0), reverse=True)
+        scores = [agent_scores.get(agent_name, 0) for agent_name in agents]
+        roles = [self.agent_roles.get(agent_name, -1) for agent_name in agents]
+
+        comps = []
+        state = {"best": None, "count": 0}
+        comp = []
+
+        def get_threshold():
+            threshold = None if state["best"] is None else state["best"] - \
+                self.tolerance
+            if len(comps) >= MAX_COMPS:
+                threshold = comps[0][0] if threshold is None else max(
+                    threshold, comps[0][0])
+            return threshold
+
+        # 'matchings' holds every set of players (bitmask) that can take the
+        # agents picked so far, one each
+        def visit(start, score, counts, matchings):
+            remaining = num_players - len(comp)
+            if remaining == 0:
+                total = score + self.get_role_score(map_name, counts)
+                if state["best"] is None or total > state["best"]:
+                    state["best"] = total
+                state["count"] += 1
+
+                threshold = get_threshold()
+                if threshold is None or total >= threshold:
+                    entry = (total, state["count"], list(comp))
+                    if len(comps) < MAX_COMPS:
+                        heapq.heappush(comps, entry)
+                    else:
+                        heapq.heapreplace(comps, entry)
+                return
+
+            for i in range(start, len(agents) - remaining + 1):
+                next_counts = counts
+                if roles[i] >= 0:
+                    next_counts = counts[:roles[i]] + \
+                        (counts[roles[i]] + 1,) + counts[roles[i] + 1:]
+
+                # Agents are sorted, so the next ones are the best still to come.
+                # Stop once even the best roles can't reach the threshold, skip
+                # this agent if its role can't
+                threshold = get_threshold()
+                if threshold is not None:
+                    best_agents = score + sum(scores[i:i + remaining])
+                    if best_agents + self.get_best_role_score(map_name, counts, remaining) < threshold:
+                        break
+                    if best_agents + self.get_best_role_score(map_name, next_counts, remaining - 1) < threshold:
+                        continue
+
+                next_matchings = set()
+                for matching in matchings:
+                    free = holders[agents[i]] & ~matching
+                    while free:
+                        player = free & -free
+                        free ^= player
+                        next_matchings.add(matching | player)
+                if len(next_matchings) == 0:
+                    continue
+
+                comp.append(agents[i])
+                visit(i + 1, score + scores[i], next_counts, next_matchings)
+                comp.pop()
+
+        visit(0, 0, (0,) * len(self.roles), {0})
+
+        threshold = get_threshold()
+        results = [(total, agents)
+                   for total, count, agents in comps if total >= threshold]
+        results.sort(key=lambda result: result[0], reverse=True)
+
+        return results
+
+    # Returns every way to give each player one of 'agents' from their pool,
+    # as lists of agent names in lobby order
+    def get_assignments(self, agents, pools):
+        assignments = [[]]
+        for i in range(len(pools)):
+            next_assignments = []
+            for assignment in assignments:
+                for agent_name in agents:
+                    if agent_name in pools[i] and not agent_name in assignment:
+                        next_assignments.append(assignment + [agent_name])
+            assignments = next_assignments
+
+        return assignments
+
+    # Gives each player one of 'agents' from their pool, picking uniformly
+    # among the ways to do so. Returns a list of agent names in lobby order
+    def assign(self, agents, pools, rng=random):
+        return rng.choice(self.get_assignments(agents, pools))
+
+    # Picks one of the best comps at random. Returns a list of agent names in
+    # lobby order, or None if the players can't all get distinct agents
+    def roll(self, map_name, pools, rng=random):
+        comps = self.search(map_name, pools, rng)
+        if len(comps) == 0:
+            return None
+
+        return self.assign(rng.choice(comps)[1], pools, rng)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+import player_model
+import roulette_engine
+import spin_timing
+
+SPIN_TICKS = spin_timing.SPIN_TICKS
+DEFAULT_BATCH_SIZE = 100000
+
+
+# Loads player data without going through the (Qt-backed) assets module
+def load_players(path):
+    players_file = open(path, "r")
+    players = player_model.players_from_dict(json.load(players_file))
+    players_file.close()
+
+    return players
+
+
+# Where a spinning player's selection starts or ends up, relative to F, the set
+# of agents in their pool that no other lobby player holds
+SPIN_INITIAL = 0  # the agent they started on (only if it's in F)
+SPIN_OTHER = 1  # any other agent in F
+SPIN_DEALER = 2
+SPIN_OUTSIDE = 3  # started on nothing/an agent outside F, never moved
+
+
+# Probabilities of each spin outcome (plus the chance the spin hit an empty
+# pool) after 'ticks' ticks, for a player with 'free_agents' agents in F who
+# starts in 'start'. Every tick draws from get_player_agent_weights: F minus
+# the player's own current agent (weighted AGENT_RANDOM_WEIGHT), plus Dealer
+# once if enabled and they're not on Dealer. On an empty pool get_random_agent
+# returns None and the selection stays where it is. Per-player agent weights
+# and recency decay aren't modelled: every agent weighs the same.
+def spin_outcome(free_agents, start, ticks, dealers_choice):
+    has_initial = 1 if start == SPIN_INITIAL else 0
+    others = free_agents - has_initial
+    weight = roulette_engine.AGENT_RANDOM_WEIGHT
+    dealer = 1 if dealers_choice else 0
+
+    # Relative weights of moving into each state, from each state
+    moves = {
+        SPIN_INITIAL: [0, weight * others, dealer, 0],
+        SPIN_OTHER: [weight * has_initial, weight * (others - 1), dealer, 0],
+        SPIN_DEALER: [weight * has_initial, weight * others, 0, 0],
+        SPIN_OUTSIDE: [weight * has_initial, weight * others, dealer, 0],
+    }
+
+    # Probability of being in each state, without/with an empty pool so far
+    states = [[0.0] * 4, [0.0] * 4]
+    states[0][start] = 1.0
+    for tick in range(ticks):
+        next_states = [[0.0] * 4, [0.0] * 4]
+        for hit_empty in range(2):
+            for state in range(4):
+                probability = states[hit_empty][state]
+                total = sum(moves[state])
+                if probability == 0.0:
+                    continue
+                if total == 0:
+                    next_states[1][state] += probability
+                    continue
+                for next_state in range(4):
+                    next_states[hit_empty][next_state] += probability * \
+                        moves[state][next_state] / total
+        states = next_states
+
+    outcome = [states[0][state] + states[1][state] for state in range(4)]
+    outcome.append(sum(states[1]))
+
+    return outcome
+
+
+# Monte Carlo simulation of full-lobby rolls. Every player in the lobby spins
+# in turn (in lobby order), with each spin tick drawing from the same pool
+# RouletteEngine.get_player_agent_weights would return. Since the other
+# players stay put during a spin, the spin's outcome only depends on how many
+# agents are free and where the player started, so each spin is sampled in
+# one step from precomputed spin_outcome tables. Many lobby rolls are
+# simulated side by side, one row per roll. That only holds while every agent
+# weighs the same, so players with per-agent weights raise a ValueError.
+class FairnessSimulator:
+    def __init__(self, players, lobby, dealers_choice=False, ticks=SPIN_TICKS, seed=None):
+        for player_name in lobby:
+            if players[player_name].weights is not None:
+                raise ValueError("player '%s' has per-agent weights, which the simulation doesn't model" %
+                                 player_name)
+
+        self.lobby = list(lobby)
+        self.dealers_choice = dealers_choice
+        self.ticks = ticks
+        self.rng = np.random.default_rng(seed)
+
+        # Columns: one per agent, then Dealer, then 'nothing selected'
+        self.agent_names = []
+        for player_name in self.lobby:
+            for key in player_model.AGENTS.get_names(players[player_name].listed):
+                if not key in self.agent_names:
+                    self.agent_names.append(key)
+        self.dealer = len(self.agent_names)
+        self.nothing = self.dealer + 1
+
+        self.pools = np.zeros((len(self.lobby), len(self.agent_names)), bool)
+        self.initial_selection = np.zeros(len(self.lobby), np.int64)
+        for i, player_name in enumerate(self.lobby):
+            for j, key in enumerate(self.agent_names):
+                self.pools[i, j] = players[player_name].has_agent(key)
+            self.initial_selection[i] = self.get_column(
+                players[player_name].selected)
+
+        # Cumulative outcome probabilities, indexed by [free agents, start]
+        self.outcomes = np.zeros((len(self.agent_names) + 1, 4, 5))
+        for free_agents in range(len(self.agent_names) + 1):
+            for start in range(4):
+                if start == SPIN_INITIAL and free_agents == 0:
+                    continue
+                self.outcomes[free_agents, start] = spin_outcome(
+                    free_agents, start, ticks, dealers_choice)
+        self.cumulative_outcomes = np.cumsum(self.outcomes[:, :, :4], axis=2)
+
+    # Maps a 'selected' value to its column
+    def get_column(self, agent_name):
+        if agent_name == "Dealer":
+            return self.dealer
+        if agent_name in self.agent_names:
+            return self.agent_names.index(agent_name)
+
+        return self.nothing
+
+    # Simulates 'count' lobby rolls. Returns final selections (count x players),
+    # per-player chances of hitting an empty pool and contested-pool flags
+    def run_batch(self, count):
+        rows = np.arange(count)
+        num_players = len(self.lobby)
+        num_agents = len(self.agent_names)
+
+        selection = np.repeat(self.initial_selection[None, :], count, axis=0)
+        holders = np.zeros((count, num_agents + 2), np.int8)
+        for i in range(num_players):
+            holders[rows, selection[:, i]] += 1
+
+        empty = np.zeros((count, num_players))
+        contested = np.zeros((count, num_players), bool)
+
+        for i in range(num_players):
+            # F: agents in this player's pool nobody else holds
+            own = selection[:, i]
+            others = holders[:, :num_agents].copy()
+            holds_agent = own < num_agents
+            others[rows[holds_agent], own[holds_agent]] -= 1
+            free = self.pools[i][None, :] & (others == 0)
+            contested[:, i] = (self.pools[i][None, :] & (others > 0)).any(axis=1)
+
+            free_agents = free.sum(axis=1)
+            start = np.full(count, SPIN_OUTSIDE)
+            start[own == self.dealer] = SPIN_DEALER
+            on_free_agent = np.zeros(count, bool)
+            on_free_agent[holds_agent] = free[rows[holds_agent],
+                                              own[holds_agent]]
+            start[on_free_agent] = SPIN_INITIAL
+
+            # Sample where the spin ends up
+            cumulative = self.cumulative_outcomes[free_agents, start]
+            outcome = (cumulative <= self.rng.random(count)
+                       [:, None]).sum(axis=1)
+            outcome = np.minimum(outcome, SPIN_OUTSIDE)
+            empty[:, i] = self.outcomes[free_agents, start, 4]
+
+            # SPIN_OTHER: uniform over F minus the starting agent
+            free[rows[on_free_agent], own[on_free_agent]] = False
+            candidates = np.cumsum(free, axis=1)
+            pick = np.floor(self.rng.random(count) *
+                            candidates[:, -1]).astype(np.int64)
+            other = (candidates <= pick[:, None]).sum(axis=1)
+
+            choice = own.copy()
+            choice[outcome == SPIN_OTHER] = other[outcome == SPIN_OTHER]
+            choice[outcome == SPIN_DEALER] = self.dealer
+
+            holders[rows, own] -= 1
+            holders[rows, choice] += 1
+            selection[:, i] = choice
+
+        return selection, empty, contested
+
+    # Simulates 'rolls' lobby rolls in batches and summarises them
+    def run(self, rolls, batch_size=DEFAULT_BATCH_SIZE):
+        num_players = len(self.lobby)
+        columns = self.agent_names + ["Dealer", ""]
+        selection_counts = np.zeros((num_players, len(columns)), np.int64)
+        empty_counts = np.zeros(num_players)
+        contested_counts = np.zeros(num_players, np.int64)
+
+        start = time.perf_counter()
+        remaining = rolls
+        while remaining > 0:
+            count = min(batch_size, remaining)
+            selection, empty, contested = self.run_batch(count)
+            for i in range(num_players):
+                selection_counts[i] += np.bincount(
+                    selection[:, i], minlength=len(columns))
+            empty_counts += empty.sum(axis=0)
+            contested_counts += contested.sum(axis=0)
+            remaining -= count
+        elapsed = time.perf_counter() - start
+
+        report = {
+            "rolls": rolls,
+            "ticks": self.ticks,
+            "dealers_choice": self.dealers_choice,
+            "elapsed_seconds": elapsed,
+            "players": {},
+            "agents": {},
+        }
+        for i, player_name in enumerate(self.lobby):
+            report["players"][player_name] = {
+                "position": i,
+                "pool_size": int(self.pools[i].sum()),
+                "empty_pool_rate": empty_counts[i] / rolls,
+                "collision_rate": contested_counts[i] / rolls,
+                "selected": {columns[j]: selection_counts[i, j] / rolls
+                             for j in range(len(columns)) if selection_counts[i, j] > 0},
+            }
+        agent_totals = selection_counts.sum(axis=0)
+        for j in range(len(columns)):
+            if agent_totals[j] > 0:
+                report["agents"][columns[j]] = agent_totals[j] / \
+                    (rolls * num_players)
+
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate lobby rolls and report selection frequencies")
+    parser.add_argument("--players", default="./players.json",
+                        help="players.json-style file to read players from")
+    parser.add_argument("--lobby", required=True,
+                        help="comma-separated player names, in lobby order")
+    parser.add_argument("--rolls", type=int, default=1000000,
+                        help="number of lobby rolls to simulate")
+    parser.add_argument("--ticks", type=int, default=SPIN_TICKS,
+                        help="ticks per spin (the GUI's is %d)" % SPIN_TICKS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="lobby rolls to simulate at once")
+    parser.add_argument("--dealers-choice", action="store_true",
+                        help="let spins land on Dealer's Choice")
+    parser.add_argument("--seed", type=int,
+                        help="seed for the simulation (random if not given)")
+    args = parser.parse_args()
+
+    players = load_players(args.players)
+    lobby = args.lobby.split(",")
+    if len(lobby) > roulette_engine.LOBBY_SIZE:
+        parser.error("lobby can't have more than %d players" %
+                     roulette_engine.LOBBY_SIZE)
+    for player_name in lobby:
+        if not player_name in players:
+            parser.error("unknown player '%s'" % player_name)
+
+    try:
+        simulator = FairnessSimulator(
+            players, lobby, args.dealers_choice, args.ticks, args.seed)
+    except ValueError as error:
+        parser.error(str(error))
+    report = simulator.run(args.rolls, args.batch_size)
+    json.dump(report, sys.stdout, indent=4, default=float)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+
+from PyQt6.QtCore import *
+
+# How long files have to stay quiet before a change is reported, so an editor
+# saving in several writes (or a temp file swapped in) is one change
+SETTLE_MS = 250
+
+# Times files that couldn't be loaded (e.g. caught half-written) are reported
+# again without changing, before waiting for their next change
+MAX_RETRIES = 3
+
+# Signature of a file being retried, unlike any real one
+RETRY_SIGNATURE = ()
+
+
+# Returns what a file's contents are compared by: (mtime, size), or None if it
+# doesn't exist
+def get_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# Watches a set of files and emits 'changed' with the ones whose contents
+# changed, once they've settled. Their directories are watched too, so files
+# that are replaced (written to a temp file, then renamed over), deleted or
+# only created later are still picked up
+class FileWatcher(QObject):
+    changed = pyqtSignal(list)
+
+    def __init__(self, paths):
+        super().__init__()
+        self.signatures = {}
+        self.retries = {}
+
+        self.watcher = QFileSystemWatcher()
+        self.watcher.fileChanged.connect(self.cb_path_changed)
+        self.watcher.directoryChanged.connect(self.cb_path_changed)
+
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.cb_timer_timeout)
+
+        self.set_paths(paths)
+
+    # Replaces the set of watched files. Files new to the set are taken as they
+    # are now, without reporting them
+    def set_paths(self, paths):
+        signatures = {}
+        for path in paths:
+            path = os.path.abspath(path)
+            if path in self.signatures:
+                signatures[path] = self.signatures[path]
+            else:
+                signatures[path] = get_signature(path)
+        self.signatures = signatures
+
+        watched = set(self.watcher.files() + self.watcher.directories())
+        wanted = set(self.signatures) | set(os.path.dirname(path) for path in self.signatures)
+        stale = [path for path in watched if not path in wanted]
+        if len(stale) > 0:
+            self.watcher.removePaths(stale)
+        self.watch()
+
+    # (Re-)adds every watched file and directory that exists -- a file that
+    # was replaced or recreated drops out of QFileSystemWatcher
+    def watch(self):
+        watched = set(self.watcher.files() + self.watcher.directories())
+        missing = []
+        for path in self.signatures:
+            for watch_path in [path, os.path.dirname(path)]:
+                if not watch_path in watched and os.path.exists(watch_path):
+                    watched.add(watch_path)
+                    missing.append(watch_path)
+        if len(missing) > 0:
+            self.watcher.addPaths(missing)
+
+    # Reports 'paths' again once they've settled, for files that couldn't be
+    # loaded
+    def retry(self, paths):
+        for path in paths:
+            path = os.path.abspath(path)
+            if not path in self.signatures or self.retries.get(path, 0) >= MAX_RETRIES:
+                continue
+            self.retries[path] = self.retries.get(path, 0) + 1
+            self.signatures[path] = RETRY_SIGNATURE
+            self.timer.start(SETTLE_MS)
+
+    def cb_path_changed(self, path):
+        self.timer.start(SETTLE_MS)
+
+    # Compares every file against its last signature, reports the ones that
+    # differ
+    def cb_timer_timeout(self):
+        self.watch()
+
+        changed = []
+        for path in self.signatures:
+            signature = get_signature(path)
+            if signature != self.signatures[path]:
+                if self.signatures[path] != RETRY_SIGNATURE:
+                    self.retries.pop(path, None)
+                self.signatures[path] = signature
+                changed.append(path)
+
+        if len(changed) > 0:
+            self.changed.emit(changed)
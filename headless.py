@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+
+import assets
+import history
+import journal
+import loadout
+import roulette_engine
+
+
+# Rolls 'args.rounds' rounds for the lobby in 'args.lobby' with the same rules
+# as the GUI's 'Roll' buttons, writing each round to stdout as a JSON line as
+# soon as it's rolled. Returns the exit code
+def run(args):
+    lobby = [player_name.strip()
+             for player_name in args.lobby.split(",") if player_name.strip() != ""]
+
+    # Headless runs only read players, so they never create or change
+    # players.db
+    players = assets.load_player_store(is_read_only=True)
+    for player_name in lobby:
+        if not player_name in players:
+            print("Unknown player: %s" % player_name, file=sys.stderr)
+            return 2
+    if len(set(lobby)) != len(lobby) or len(lobby) > roulette_engine.LOBBY_SIZE:
+        print("A lobby is up to %d different players" %
+              roulette_engine.LOBBY_SIZE, file=sys.stderr)
+        return 2
+
+    engine = roulette_engine.RouletteEngine(players, args.seed)
+    if args.journal is not None:
+        engine.journal = journal.JournalWriter(args.journal, engine.seed)
+    if args.history is not None:
+        engine.history = history.RollHistory(args.history)
+    engine.is_dealers_choice_enabled = args.dealers_choice
+    engine.is_anti_repeat_enabled = args.no_repeat
+    engine.set_recency_decay(args.recency_decay)
+    for player_name in lobby:
+        engine.add_player_to_lobby(player_name)
+
+    # Weapons are rolled like the GUI's weapon wheels: a different weapon to
+    # last round's, or a loadout within budget
+    weapons = None
+    loadouts = None
+    if args.weapons or args.credits is not None:
+        weapons = assets.load_weapons(assets.WEAPON_DATA_PATH)
+    if args.credits is not None:
+        loadouts = loadout.LoadoutTable(weapons)
+    primary = None
+    sidearm = None
+
+    output = sys.stdout
+    try:
+        for i in range(args.rounds):
+            roll = {"round": i, "agents": dict(zip(lobby, engine.roll_round()))}
+            for player_name in lobby:
+                if roll["agents"][player_name] is not None:
+                    engine.record_agent(player_name)
+
+            if loadouts is not None:
+                rolled = engine.roll_loadout(loadouts, args.credits)
+                if rolled is None:
+                    rolled = (None, None, None, None)
+                roll["cost"], roll["primary"], roll["sidearm"], roll["shields"] = rolled
+                if rolled[1] is not None:
+                    engine.record_weapon("primary", rolled[1])
+                    engine.record_weapon("sidearm", rolled[2])
+            elif weapons is not None:
+                primary = engine.get_random_weapon(
+                    "primary", weapons["primary"], primary)
+                sidearm = engine.get_random_weapon(
+                    "sidearm", weapons["sidearm"], sidearm)
+                roll["primary"] = primary
+                roll["sidearm"] = sidearm
+                engine.record_weapon("primary", primary)
+                engine.record_weapon("sidearm", sidearm)
+
+            output.write(json.dumps(roll) + "\n")
+        output.flush()
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into 'head') -- stop quietly, and keep
+        # Python from complaining when it flushes stdout on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), output.fileno())
+    finally:
+        players.close()
+        if engine.journal is not None:
+            engine.journal.close()
+        if engine.history is not None:
+            engine.history.close()
+
+    return 0
@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import array
+import bisect
+
+# Roll history is a directory of column files holding one entry per final
+# result (a player's agent, or a weapon the lobby got):
+#   time.col    int64   unix time
+#   player.col  uint32  name id of the player
+#   kind.col    uint8   what was rolled, index into KINDS
+#   value.col   uint32  name id of the agent or weapon
+# Names are interned in names.txt, one JSON string per line (an id is a line
+# number). Running counters are saved to counters.json with the number of rows
+# they cover, so opening a history only folds in rows added after that
+HISTORY_COLUMNS = [("time", "q"), ("player", "I"), ("kind", "B"), ("value", "I")]
+KINDS = ["agent", "primary", "sidearm"]
+
+# Rows buffered before they're written out without waiting for flush()
+FLUSH_ROWS = 256
+
+# Results of each kind kept per player, newest last (see get_recent)
+RECENT_RESULTS = 8
+
+# Bumped when the counters change shape, so an older counters.json is rebuilt
+# from the rows instead of being used
+COUNTERS_VERSION = 2
+
+
+# Returns empty counters for one player: 'counts' of each value and total
+# 'rolls' by kind, the 'last' value of each kind with its current 'streak',
+# the 'recent' values of each kind and each kind's longest streak as
+# [value, length]
+def create_player_counters():
+    return {
+        "counts": {kind: {} for kind in KINDS},
+        "rolls": {kind: 0 for kind in KINDS},
+        "last": {kind: None for kind in KINDS},
+        "recent": {kind: [] for kind in KINDS},
+        "streak": {kind: 0 for kind in KINDS},
+        "best_streak": {kind: [None, 0] for kind in KINDS},
+    }
+
+
+# Adds one result to a player's counters in 'counters'
+def count_result(counters, player_name, kind, value):
+    player_counters = counters.get(player_name)
+    if player_counters is None:
+        player_counters = create_player_counters()
+        counters[player_name] = player_counters
+
+    counts = player_counters["counts"][kind]
+    counts[value] = counts.get(value, 0) + 1
+    player_counters["rolls"][kind] += 1
+
+    recent = player_counters["recent"][kind]
+    recent.append(value)
+    if len(recent) > RECENT_RESULTS:
+        del recent[0]
+
+    if player_counters["last"][kind] == value:
+        player_counters["streak"][kind] += 1
+    else:
+        player_counters["last"][kind] = value
+        player_counters["streak"][kind] = 1
+    if player_counters["streak"][kind] > player_counters["best_streak"][kind][1]:
+        player_counters["best_streak"][kind] = [
+            value, player_counters["streak"][kind]]
+
+
+# A roll history opened 'is_read_only' (e.g. for stats while the roulette is
+# running) never writes: it doesn't create the directory, leaves partly
+# written rows and names as they are instead of cutting them off, and doesn't
+# save counters on close
+class RollHistory:
+    def __init__(self, path, is_read_only=False):
+        if not is_read_only:
+            os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.is_read_only = is_read_only
+
+        # Rows on disk, and rows waiting in 'buffers'. Counted before names
+        # are read: names are written first, so every row counted has its
+        # names on disk by then
+        self.rows = self.repair_columns()
+        self.buffers = {}
+        for column, typecode in HISTORY_COLUMNS:
+            self.buffers[column] = array.array(typecode)
+
+        # Interned names, and names not written to names.txt yet
+        self.names = []
+        self.name_ids = {}
+        self.new_names = []
+        self.load_names()
+
+        # Counters from the last save, brought up to date with any rows added
+        # since (e.g. if the app didn't close cleanly)
+        self.counters = {}
+        covered_rows = 0
+        counters_path = os.path.join(path, "counters.json")
+        if os.path.exists(counters_path):
+            counters_file = open(counters_path, "r")
+            saved = json.load(counters_file)
+            counters_file.close()
+            if saved.get("version") == COUNTERS_VERSION and saved["rows"] <= self.rows:
+                self.counters = saved["players"]
+                covered_rows = saved["rows"]
+        self.fold_rows(self.counters, covered_rows)
+
+        self.column_files = {}
+        self.names_file = None
+        if is_read_only:
+            return
+        for column, typecode in HISTORY_COLUMNS:
+            self.column_files[column] = open(
+                self.get_column_path(column), "ab")
+        self.names_file = open(os.path.join(path, "names.txt"), "a")
+
+    def get_column_path(self, column):
+        return os.path.join(self.path, column + ".col")
+
+    def load_names(self):
+        names_path = os.path.join(self.path, "names.txt")
+        if not os.path.exists(names_path):
+            return
+
+        names_file = open(names_path, "r")
+        lines = names_file.read().split("\n")
+        names_file.close()
+
+        # The last line is only complete if the file ends in a newline
+        for line in lines[:-1]:
+            self.name_ids[json.loads(line)] = len(self.names)
+            self.names.append(json.loads(line))
+        if lines[-1] != "" and not self.is_read_only:
+            os.truncate(names_path, os.path.getsize(names_path) - len(lines[-1].encode()))
+
+    # Cuts every column back to the shortest one, in case writing them was
+    # interrupted part way (read-only, only counts up to it). Returns the
+    # number of rows
+    def repair_columns(self):
+        rows = None
+        for column, typecode in HISTORY_COLUMNS:
+            column_path = self.get_column_path(column)
+            size = os.path.getsize(column_path) if os.path.exists(column_path) else 0
+            column_rows = size // array.array(typecode).itemsize
+            rows = column_rows if rows is None else min(rows, column_rows)
+        if self.is_read_only:
+            return rows
+
+        for column, typecode in HISTORY_COLUMNS:
+            column_path = self.get_column_path(column)
+            if os.path.exists(column_path):
+                os.truncate(column_path, rows * array.array(typecode).itemsize)
+
+        return rows
+
+    # Reads rows 'start' onwards of the given columns from disk
+    def read_columns(self, columns, start=0):
+        values = {}
+        for column, typecode in HISTORY_COLUMNS:
+            if not column in columns:
+                continue
+
+            values[column] = array.array(typecode)
+            column_path = self.get_column_path(column)
+            if not os.path.exists(column_path):
+                continue
+
+            column_file = open(column_path, "rb")
+            column_file.seek(start * values[column].itemsize)
+            values[column].frombytes(column_file.read(
+                (self.rows - start) * values[column].itemsize))
+            column_file.close()
+
+        return values
+
+    # Adds rows 'start' onwards on disk to 'counters'
+    def fold_rows(self, counters, start):
+        values = self.read_columns(["player", "kind", "value"], start)
+        for player_id, kind, value_id in zip(values["player"], values["kind"], values["value"]):
+            count_result(
+                counters, self.names[player_id], KINDS[kind], self.names[value_id])
+
+    # Returns the id of a name, interning it if it's new
+    def intern(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.name_ids[name] = name_id
+            self.names.append(name)
+            self.new_names.append(name)
+
+        return name_id
+
+    # Records a final result: 'player_name' got 'value' (an agent, or a
+    # 'primary' or 'sidearm' weapon)
+    def record(self, player_name, kind, value, timestamp=None):
+        if self.is_read_only:
+            raise ValueError("History is open read-only")
+
+        self.buffers["time"].append(int(time.time() if timestamp is None else timestamp))
+        self.buffers["player"].append(self.intern(player_name))
+        self.buffers["kind"].append(KINDS.index(kind))
+        self.buffers["value"].append(self.intern(value))
+        count_result(self.counters, player_name, kind, value)
+
+        if len(self.buffers["time"]) >= FLUSH_ROWS:
+            self.flush()
+
+    # Returns the last value of a kind a player got, or None
+    def get_last(self, player_name, kind):
+        player_counters = self.counters.get(player_name)
+        if player_counters is None:
+            return None
+
+        return player_counters["last"][kind]
+
+    # Returns the last RECENT_RESULTS values of a kind a player got, newest
+    # last
+    def get_recent(self, player_name, kind):
+        player_counters = self.counters.get(player_name)
+        if player_counters is None:
+            return []
+
+        return player_counters["recent"][kind]
+
+    # Returns a player's counters (see create_player_counters), or None
+    def get_counters(self, player_name):
+        return self.counters.get(player_name)
+
+    # Returns counters for only the rows recorded at or after unix time
+    # 'since'. Rows are appended in time order, so the first one is found by
+    # bisecting the time column and only rows from there on are read
+    def count_since(self, since):
+        self.flush()
+        times = self.read_columns(["time"])["time"]
+        counters = {}
+        self.fold_rows(counters, bisect.bisect_left(times, since))
+
+        return counters
+
+    # Writes buffered names and rows out (names first, so rows on disk only
+    # ever refer to names that are there too)
+    def flush(self):
+        if len(self.new_names) > 0:
+            self.names_file.write("".join(json.dumps(name) + "\n" for name in self.new_names))
+            self.names_file.flush()
+            self.new_names.clear()
+
+        row_count = len(self.buffers["time"])
+        if row_count == 0:
+            return
+
+        for column, typecode in HISTORY_COLUMNS:
+            self.buffers[column].tofile(self.column_files[column])
+            self.column_files[column].flush()
+            del self.buffers[column][:]
+        self.rows += row_count
+
+    # Flushes, and saves the counters so the next open doesn't fold in rows
+    # all over again
+    def close(self):
+        if self.is_read_only:
+            return
+
+        self.flush()
+        for column in self.column_files:
+            self.column_files[column].close()
+        self.names_file.close()
+
+        counters_path = os.path.join(self.path, "counters.json")
+        temp_path = counters_path + ".tmp"
+        counters_file = open(temp_path, "w")
+        json.dump({"version": COUNTERS_VERSION, "rows": self.rows,
+                   "players": self.counters}, counters_file)
+        counters_file.close()
+        os.replace(temp_path, counters_path)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import assets
+import history
+
+
+# Prints per-player roll stats from the history: how often each agent and
+# weapon came up, streaks, and how often Dealer's Choice fired. Reads the
+# running counters, so it doesn't scan the history unless --since is given
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", default=assets.HISTORY_PATH, metavar="PATH",
+                        help="history to read (default: %s)" % assets.HISTORY_PATH)
+    parser.add_argument("--player", action="append", metavar="NAME",
+                        help="only show this player (can be repeated)")
+    parser.add_argument("--since", type=float, metavar="DAYS",
+                        help="only count results from the last DAYS days")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.history):
+        print("No history at: %s" % args.history, file=sys.stderr)
+        sys.exit(1)
+
+    # Read-only, so it's safe to run while the roulette is writing the history
+    roll_history = history.RollHistory(args.history, is_read_only=True)
+    if args.since is not None:
+        counters = roll_history.count_since(time.time() - args.since * 86400)
+    else:
+        counters = roll_history.counters
+
+    stats = {}
+    for player_name in sorted(counters):
+        if args.player is not None and not player_name in args.player:
+            continue
+
+        player_counters = counters[player_name]
+        player_stats = {}
+        for kind in history.KINDS:
+            counts = player_counters["counts"][kind]
+            player_stats[kind] = {
+                "rolls": player_counters["rolls"][kind],
+                "counts": dict(sorted(counts.items(), key=lambda item: (-item[1], item[0]))),
+                "last": player_counters["last"][kind],
+                "streak": player_counters["streak"][kind],
+                "best_streak": player_counters["best_streak"][kind],
+            }
+
+        agent_rolls = player_counters["rolls"]["agent"]
+        player_stats["dealers_choice_rate"] = player_counters["counts"]["agent"].get(
+            "Dealer", 0) / agent_rolls if agent_rolls > 0 else 0
+        stats[player_name] = player_stats
+    roll_history.close()
+
+    if args.player is not None:
+        for player_name in args.player:
+            if not player_name in stats:
+                print("No history for player: %s" % player_name, file=sys.stderr)
+
+    print(json.dumps(stats, indent=4))
+
+
+if __name__ == "__main__":
+    main()
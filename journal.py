@@ -0,0 +1,518 @@
+import os
+import struct
+import bisect
+import itertools
+
+import roulette_engine
+
+# A journal is a header (magic, version, record size, session seed) followed by
+# fixed-width 8-byte records. A roll record is (stream id, bound, draw, value
+# id): the stream's random generator drew 'draw' from randrange(bound) and the
+# wheel showed 'value'. Stream and value names are interned -- the first time
+# one is used, a name record (NAME_RECORD, table, id, length) is written,
+# followed by the UTF-8 name padded out to whole records.
+#
+# From version 2, every draw can be mapped back to its value. Before a
+# stream's first roll (and whenever what it draws from is replaced), a
+# candidates record (CANDIDATES_RECORD, stream id, count, skip) is followed by
+# the unit width in bytes, 'count' value ids and their units, padded out to
+# whole records. A draw counts through the values' units in order, passing
+# over the units of the value at 'skip' (NO_SKIP for none). A lobby player's
+# agent wheel writes a LOBBY_CANDIDATES_RECORD instead, whose values weigh
+# nothing while a lobby player holds them: (HOLD_RECORD, stream id, value id,
+# 0) says the player whose agent wheel is that stream now holds that agent
+# (NO_VALUE for none). A player taking the agent their wheel just landed on
+# (every spin tick) sets HELD_ROLL in that roll's stream id instead, so spins
+# stay one record per roll. (SKIP_RECORD, stream id, skip, held skip) is
+# written when only the values left out change: 'held skip' is a value that
+# only the stream's own player leaves out while they hold it (Dealer's
+# Choice, which any number of players can hold). A roll that now leaves out
+# the value its stream last landed on (a spinning weapon wheel) sets
+# SKIPS_LAST in its stream id instead. Rolls whose bound doesn't fit 16 bits
+# are written as a wide roll record (WIDE_RECORD, stream id, width, value id)
+# followed by the bound and draw, 'width' bytes each
+JOURNAL_HEADER = struct.Struct("<4sHHQ")
+JOURNAL_MAGIC = b"VRJ1"
+JOURNAL_VERSION = 2
+JOURNAL_RECORD = struct.Struct("<HHHH")
+
+NAME_RECORD = 0xFFFF
+CANDIDATES_RECORD = 0xFFFE
+LOBBY_CANDIDATES_RECORD = 0xFFFD
+HOLD_RECORD = 0xFFFC
+SKIP_RECORD = 0xFFFB
+WIDE_RECORD = 0xFFFA
+STREAM_TABLE = 0
+VALUE_TABLE = 1
+
+# Flags on a roll's stream id. A flagged stream id mustn't reach the other
+# records' markers, which caps the streams there can be
+HELD_ROLL = 0x8000
+SKIPS_LAST = 0x4000
+ROLL_FLAGS = HELD_ROLL | SKIPS_LAST
+MAX_STREAMS = WIDE_RECORD - ROLL_FLAGS
+
+NO_SKIP = 0xFFFF
+NO_VALUE = 0xFFFF
+MAX_COMPACT_BOUND = 0xFFFF
+
+
+# Returns 'data' padded out to whole records
+def pad_records(data):
+    return data + bytes(-len(data) % JOURNAL_RECORD.size)
+
+
+# Appends rolls to a journal file. Records are packed into a buffer that's
+# only written out when it fills up or on flush(), so a spin tick never waits
+# on the disk
+class JournalWriter:
+    def __init__(self, path, seed, buffer_size=65536):
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.journal_file = open(path, "wb")
+        self.journal_file.write(JOURNAL_HEADER.pack(
+            JOURNAL_MAGIC, JOURNAL_VERSION, JOURNAL_RECORD.size, seed))
+
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.stream_ids = {}
+        self.value_ids = {}
+
+        # Key of the candidates last recorded for each stream (see
+        # is_current), the values and the (skip, held skip) indices each one
+        # leaves out, the value each stream last landed on, and the stream
+        # whose next roll gets SKIPS_LAST
+        self.candidate_keys = {}
+        self.candidate_values = {}
+        self.candidate_skips = {}
+        self.last_values = {}
+        self.skipping_last = None
+
+        # Agent each lobby player's wheel (stream) holds, and (stream, value,
+        # end of the record in 'buffer') of the last roll written
+        self.holds = {}
+        self.last_roll = None
+
+    # Returns the id of a stream/value name, writing its name record if new
+    def intern(self, table, ids, name):
+        if not name in ids:
+            if table == STREAM_TABLE and len(ids) >= MAX_STREAMS:
+                raise ValueError("A journal holds at most %d streams" % MAX_STREAMS)
+            if table == VALUE_TABLE and len(ids) >= NO_VALUE:
+                raise ValueError("A journal holds at most %d values" % NO_VALUE)
+            ids[name] = len(ids)
+            name_data = name.encode()
+            self.buffer += JOURNAL_RECORD.pack(NAME_RECORD,
+                                               table, ids[name], len(name_data))
+            self.buffer += pad_records(name_data)
+
+        return ids[name]
+
+    def get_stream_id(self, stream_name):
+        stream_id = self.stream_ids.get(stream_name)
+        if stream_id is None:
+            stream_id = self.intern(STREAM_TABLE, self.stream_ids, stream_name)
+
+        return stream_id
+
+    # Checks if the candidates last recorded for a stream are the ones 'key'
+    # (anything that's replaced when they are) stands for
+    def is_current(self, stream_name, key):
+        return stream_name in self.candidate_keys and self.candidate_keys[stream_name] == key
+
+    # Records what a stream draws from: 'value_names' weighing 'units' each,
+    # leaving out the one at index 'skip' (None for none), and weighing
+    # nothing while they're held if 'is_lobby' (see record_hold). 'key' is
+    # kept for is_current
+    def record_candidates(self, stream_name, key, value_names, units, skip=None, is_lobby=False):
+        stream_id = self.get_stream_id(stream_name)
+        value_ids = [self.intern(VALUE_TABLE, self.value_ids, value_name)
+                     for value_name in value_names]
+        width = max(max(units, default=0).bit_length() + 7 >> 3, 1)
+
+        self.buffer += JOURNAL_RECORD.pack(
+            LOBBY_CANDIDATES_RECORD if is_lobby else CANDIDATES_RECORD,
+            stream_id, len(value_ids), NO_SKIP if skip is None else skip)
+        self.buffer += pad_records(struct.pack("<H%dH" % len(value_ids), width, *value_ids) +
+                                   b"".join(unit.to_bytes(width, "little") for unit in units))
+        self.candidate_keys[stream_name] = key
+        self.candidate_values[stream_name] = list(value_names)
+        self.candidate_skips[stream_name] = (skip, None)
+        if self.skipping_last == stream_name:
+            self.skipping_last = None
+
+    # Records that the lobby player whose agent wheel is 'stream_name' now
+    # holds agent 'value_name' (None for none), if that's changed. Taking what
+    # their wheel just landed on only flags that roll
+    def record_hold(self, stream_name, value_name):
+        if self.holds.get(stream_name) == value_name:
+            return
+        self.holds[stream_name] = value_name
+
+        if self.last_roll == (stream_name, value_name, len(self.buffer)):
+            # High byte of the roll's stream id
+            self.buffer[len(self.buffer) - JOURNAL_RECORD.size + 1] |= HELD_ROLL >> 8
+            return
+
+        value_id = NO_VALUE
+        if value_name is not None:
+            value_id = self.value_ids.get(value_name)
+            if value_id is None:
+                value_id = self.intern(VALUE_TABLE, self.value_ids, value_name)
+        self.buffer += JOURNAL_RECORD.pack(HOLD_RECORD, self.get_stream_id(stream_name), value_id, 0)
+
+    # Records that a stream's draws now leave out the values at index 'skip'
+    # and 'held_skip' (None for none; see above) of its candidates, if
+    # that's changed. Only 'skip' moving to the value the stream last landed
+    # on is left to flag its next roll
+    def record_skip(self, stream_name, skip, held_skip=None):
+        last_skip, last_held_skip = self.candidate_skips[stream_name]
+        if skip == last_skip and held_skip == last_held_skip:
+            return
+
+        self.candidate_skips[stream_name] = (skip, held_skip)
+        if skip is not None and held_skip == last_held_skip and skip == self.get_last_index(stream_name):
+            if self.skipping_last is not None and self.skipping_last != stream_name:
+                self.write_skip(self.skipping_last)
+            self.skipping_last = stream_name
+            return
+        if self.skipping_last == stream_name:
+            self.skipping_last = None
+        self.write_skip(stream_name)
+
+    # Returns the index of the first of a stream's candidates that's the
+    # value it last landed on, None if there isn't one
+    def get_last_index(self, stream_name):
+        value_names = self.candidate_values[stream_name]
+        last_value = self.last_values.get(stream_name)
+        if not last_value in value_names:
+            return None
+
+        return value_names.index(last_value)
+
+    def write_skip(self, stream_name):
+        skip, held_skip = self.candidate_skips[stream_name]
+        self.buffer += JOURNAL_RECORD.pack(
+            SKIP_RECORD, self.stream_ids[stream_name], NO_SKIP if skip is None else skip,
+            NO_SKIP if held_skip is None else held_skip)
+
+    # Records that stream 'stream_name' drew 'draw' from randrange(bound),
+    # landing on 'value_name'
+    def record(self, stream_name, bound, draw, value_name):
+        stream_id = self.stream_ids.get(stream_name)
+        if stream_id is None:
+            stream_id = self.get_stream_id(stream_name)
+        value_id = self.value_ids.get(value_name)
+        if value_id is None:
+            value_id = self.intern(VALUE_TABLE, self.value_ids, value_name)
+
+        if not 0 <= draw < bound:
+            raise ValueError("Draw %r is outside randrange(%r) on stream %s" % (draw, bound, stream_name))
+        if self.skipping_last is not None:
+            if self.skipping_last == stream_name:
+                stream_id |= SKIPS_LAST
+            else:
+                self.write_skip(self.skipping_last)
+            self.skipping_last = None
+        self.last_values[stream_name] = value_name
+
+        if bound <= MAX_COMPACT_BOUND:
+            self.buffer += JOURNAL_RECORD.pack(stream_id, bound, draw, value_id)
+            self.last_roll = (stream_name, value_name, len(self.buffer))
+        else:
+            width = bound.bit_length() + 7 >> 3
+            self.buffer += JOURNAL_RECORD.pack(WIDE_RECORD, stream_id, width, value_id)
+            self.buffer += pad_records(bound.to_bytes(width, "little") + draw.to_bytes(width, "little"))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+
+        self.journal_file.write(self.buffer)
+        self.journal_file.flush()
+        self.buffer.clear()
+        self.last_roll = None
+
+    def close(self):
+        self.flush()
+        self.journal_file.close()
+
+
+# Opens a journal. Returns (seed, version, records) with records an iterator
+# over the raw (stream id, bound, draw, value id) records, name records
+# included
+def open_journal(path):
+    journal_file = open(path, "rb")
+    data = journal_file.read()
+    journal_file.close()
+
+    if len(data) < JOURNAL_HEADER.size:
+        raise ValueError("%s isn't a journal" % path)
+    magic, version, record_size, seed = JOURNAL_HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC or not 1 <= version <= JOURNAL_VERSION or record_size != JOURNAL_RECORD.size:
+        raise ValueError("%s isn't a version 1-%d journal" %
+                         (path, JOURNAL_VERSION))
+
+    # Ignore a partly written record at the end
+    end = len(data) - (len(data) - JOURNAL_HEADER.size) % JOURNAL_RECORD.size
+    return seed, version, JOURNAL_RECORD.iter_unpack(memoryview(data)[JOURNAL_HEADER.size:end])
+
+
+# Reads the 'length' bytes following a record from 'records'
+def read_data(records, length):
+    data = b""
+    for record in itertools.islice(records, -(-length // JOURNAL_RECORD.size)):
+        data += JOURNAL_RECORD.pack(*record)
+
+    return data[:length]
+
+
+# Reads the name following a name record of 'length' bytes from 'records'
+def read_name(records, length):
+    return read_data(records, length).decode(errors="replace")
+
+
+# Reads the data following a candidates record for 'count' values from
+# 'records'. Returns (value ids, units)
+def read_candidates(records, count):
+    # The unit width comes first, and says how long the rest is
+    data = JOURNAL_RECORD.pack(*next(records))
+    width = struct.unpack_from("<H", data)[0]
+    data += read_data(records, max(2 + count * (2 + width) - len(data), 0))
+
+    value_ids = list(struct.unpack_from("<%dH" % count, data, 2))
+    start = 2 + count * 2
+    units = [int.from_bytes(data[start + i * width:start + (i + 1) * width], "little")
+             for i in range(count)]
+
+    return value_ids, units
+
+
+# Reads the bound and draw following a wide roll record of 'width' bytes
+# each from 'records'
+def read_wide_roll(records, width):
+    data = read_data(records, width * 2)
+    return int.from_bytes(data[:width], "little"), int.from_bytes(data[width:], "little")
+
+
+# Reads a journal. Returns (seed, stream names, value names, rolls) with
+# rolls a list of (stream id, bound, draw, value id), ids indexing the names
+def read_journal(path):
+    seed, version, records = open_journal(path)
+
+    names = ([], [])
+    rolls = []
+    for stream_id, bound, draw, value_id in records:
+        if stream_id < WIDE_RECORD:
+            rolls.append((stream_id & ~ROLL_FLAGS, bound, draw, value_id))
+            continue
+        if stream_id == NAME_RECORD:
+            # bound, draw, value_id are the table, id and name length here
+            names[bound].append(read_name(records, value_id))
+            continue
+        if stream_id == CANDIDATES_RECORD or stream_id == LOBBY_CANDIDATES_RECORD:
+            read_candidates(records, draw)
+            continue
+        if stream_id == HOLD_RECORD or stream_id == SKIP_RECORD:
+            continue
+        if stream_id == WIDE_RECORD:
+            # bound, draw are the stream id and width here
+            stream_id = bound & ~ROLL_FLAGS
+            bound, draw = read_wide_roll(records, draw)
+
+        rolls.append((stream_id, bound, draw, value_id))
+
+    return seed, names[STREAM_TABLE], names[VALUE_TABLE], rolls
+
+
+# What a stream draws from, for checking its draws' values. Draws count
+# through the units of the values that aren't 'gaps' (a lobby agent wheel's
+# taken agents, kept sorted) or the skipped values
+class Candidates:
+    def __init__(self, value_ids, units, skip):
+        self.value_ids = value_ids
+        self.units = units
+        self.skip = skip
+        self.held_skip = NO_SKIP
+        self.prefixes = [0] + list(itertools.accumulate(units))
+
+        self.gaps = []
+        self.gap_units = 0
+
+    def set_taken(self, index, is_taken):
+        if is_taken:
+            bisect.insort(self.gaps, index)
+            self.gap_units += self.units[index]
+        else:
+            self.gaps.remove(index)
+            self.gap_units -= self.units[index]
+
+    # Returns the id of the value a draw from randrange(bound) lands on, None
+    # if the bound doesn't match. Only a few values are ever taken at once, so
+    # this walks the stretches of values between them
+    def get_value_id(self, bound, draw):
+        prefixes = self.prefixes
+        gaps = self.gaps
+        skip_units = 0
+        for skip in (self.skip, self.held_skip):
+            if skip < len(self.units) and not skip in gaps:
+                skip_units += self.units[skip]
+                gaps = sorted(gaps + [skip])
+        if bound != prefixes[-1] - self.gap_units - skip_units:
+            return None
+
+        start = 0
+        for gap in gaps:
+            stretch = prefixes[gap] - prefixes[start]
+            if draw < stretch:
+                break
+            draw -= stretch
+            start = gap + 1
+
+        return self.value_ids[bisect.bisect_right(prefixes, draw + prefixes[start]) - 1]
+
+
+# Re-draws every roll in a journal from the session seed and checks each one
+# matches, and (from version 2) lands on the value that was logged. Returns
+# the number of rolls, a list of the indices that don't match and the number
+# of rolls whose values weren't checked (version 1 journals, or all of them
+# without 'check_values', which re-draws several times faster)
+def verify_journal(path, check_values=True):
+    seed, version, records = open_journal(path)
+    if version < 2 or not check_values:
+        count, mismatches = verify_draws(seed, records)
+        return count, mismatches, count
+
+    # randrange(bound) is _randbelow(bound) for the bounds the wheels use;
+    # calling it directly skips randrange's argument checks
+    draw_functions = []
+    candidates = []
+    count = 0
+    mismatches = []
+
+    # The agent each stream's player holds, how many players hold each
+    # value, and the lobby agent wheels that have each value ({stream id:
+    # index})
+    holds = []
+    hold_counts = []
+    holders = []
+
+    # The value each stream last landed on
+    last_values = []
+
+    # Moves what a stream's player holds to 'value_id' (NO_VALUE for none),
+    # taking it out of the lobby agent wheels once anyone holds it
+    def set_hold(stream_id, value_id):
+        held_id = holds[stream_id]
+        holds[stream_id] = value_id
+        if held_id != NO_VALUE:
+            hold_counts[held_id] -= 1
+            if hold_counts[held_id] == 0:
+                for holder, index in holders[held_id].items():
+                    candidates[holder].set_taken(index, False)
+        if value_id != NO_VALUE:
+            hold_counts[value_id] += 1
+            if hold_counts[value_id] == 1:
+                for holder, index in holders[value_id].items():
+                    candidates[holder].set_taken(index, True)
+
+    for stream_id, bound, draw, value_id in records:
+        if stream_id >= WIDE_RECORD:
+            if stream_id == HOLD_RECORD:
+                # bound, draw are the stream id and value id here
+                if holds[bound] != draw:
+                    set_hold(bound, draw)
+                continue
+            if stream_id == SKIP_RECORD:
+                # bound, draw, value_id are the stream id, skip and held
+                # skip here
+                candidates[bound].skip = draw
+                candidates[bound].held_skip = value_id
+                continue
+            if stream_id == NAME_RECORD:
+                name = read_name(records, value_id)
+                if bound == STREAM_TABLE:
+                    draw_functions.append(roulette_engine.create_stream(
+                        seed, name)._randbelow)
+                    candidates.append(None)
+                    holds.append(NO_VALUE)
+                    last_values.append(NO_VALUE)
+                else:
+                    hold_counts.append(0)
+                    holders.append({})
+                continue
+            if stream_id != WIDE_RECORD:
+                # bound, draw, value_id are the stream id, count and skip here
+                if candidates[bound] is not None:
+                    for candidate_id in candidates[bound].value_ids:
+                        holders[candidate_id].pop(bound, None)
+                candidates[bound] = Candidates(*read_candidates(records, draw), value_id)
+                if stream_id == LOBBY_CANDIDATES_RECORD:
+                    for index, candidate_id in enumerate(candidates[bound].value_ids):
+                        holders[candidate_id][bound] = index
+                        if hold_counts[candidate_id] > 0:
+                            candidates[bound].set_taken(index, True)
+                continue
+
+            # bound, draw are the stream id and width here
+            stream_id = bound
+            bound, draw = read_wide_roll(records, draw)
+
+        flags = stream_id & ROLL_FLAGS
+        stream_id ^= flags
+        stream_candidates = candidates[stream_id]
+        if flags & SKIPS_LAST and stream_candidates is not None:
+            if last_values[stream_id] in stream_candidates.value_ids:
+                stream_candidates.skip = stream_candidates.value_ids.index(last_values[stream_id])
+            else:
+                stream_candidates = None
+
+        if draw_functions[stream_id](bound) != draw:
+            mismatches.append(count)
+        elif stream_candidates is None or stream_candidates.get_value_id(bound, draw) != value_id:
+            mismatches.append(count)
+        if flags & HELD_ROLL and holds[stream_id] != value_id:
+            set_hold(stream_id, value_id)
+        last_values[stream_id] = value_id
+        count += 1
+
+    return count, mismatches, 0
+
+
+# Re-draws every roll in a journal's records from the seed, without checking
+# the values. Returns the number of rolls and a list of the indices that
+# don't match
+def verify_draws(seed, records):
+    draw_functions = []
+    count = 0
+    mismatches = []
+
+    for stream_id, bound, draw, value_id in records:
+        if stream_id >= SKIPS_LAST:
+            if stream_id < WIDE_RECORD:
+                stream_id &= ~ROLL_FLAGS
+            elif stream_id == NAME_RECORD:
+                name = read_name(records, value_id)
+                if bound == STREAM_TABLE:
+                    draw_functions.append(roulette_engine.create_stream(
+                        seed, name)._randbelow)
+                continue
+            elif stream_id == CANDIDATES_RECORD or stream_id == LOBBY_CANDIDATES_RECORD:
+                read_candidates(records, draw)
+                continue
+            elif stream_id != WIDE_RECORD:
+                continue
+            else:
+                stream_id = bound & ~ROLL_FLAGS
+                bound, draw = read_wide_roll(records, draw)
+
+        if draw_functions[stream_id](bound) != draw:
+            mismatches.append(count)
+        count += 1
+
+    return count, mismatches
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import json
+import time
+import random
+import asyncio
+import argparse
+
+
+# Minimal keep-alive HTTP/JSON client for one connection to server.py
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, method, path, body=None):
+        data = b"" if body is None else json.dumps(body).encode()
+        self.writer.write(("%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                           "Content-Length: %d\r\n\r\n" % (method, path, len(data))).encode() + data)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, value = line.decode("latin-1").split(":", 1)
+            if key.strip().lower() == "content-length":
+                length = int(value)
+
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        self.writer.close()
+
+
+async def connect(args):
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    return Client(reader, writer)
+
+
+# One lobby: create it, fill it, then roll it 'rolls' times back to back,
+# timing every roll
+async def run_lobby(args, player_names, latencies, errors, rng):
+    client = await connect(args)
+    try:
+        status, lobby = await client.request("POST", "/lobbies", {"dealers_choice": args.dealers_choice})
+        if status != 200:
+            errors.append(status)
+            return
+
+        for player_name in rng.sample(player_names, min(args.lobby_size, len(player_names))):
+            await client.request("POST", "/lobbies/%s/players" % lobby["id"], {"name": player_name})
+
+        for i in range(args.rolls):
+            start = time.perf_counter()
+            status, result = await client.request("POST", "/lobbies/%s/roll" % lobby["id"])
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+
+        await client.request("DELETE", "/lobbies/%s" % lobby["id"])
+    finally:
+        client.close()
+
+
+async def run(args):
+    client = await connect(args)
+    status, players = await client.request("GET", "/players")
+    client.close()
+
+    rng = random.Random(args.seed)
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*[run_lobby(args, players["players"], latencies, errors, rng)
+                           for i in range(args.lobbies)])
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    report = {
+        "lobbies": args.lobbies,
+        "rolls": len(latencies),
+        "errors": len(errors),
+        "seconds": seconds,
+        "rolls_per_second": len(latencies) / seconds,
+    }
+    if len(latencies) > 0:
+        report["p50_ms"] = latencies[len(latencies) // 2] * 1000
+        report["p99_ms"] = latencies[min(len(latencies) - 1,
+                                         len(latencies) * 99 // 100)] * 1000
+        report["max_ms"] = latencies[-1] * 1000
+    print(json.dumps(report, indent=4))
+
+
+# Runs many lobbies at once against a running server.py, each on its own
+# connection, and reports roll latency
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--lobbies", type=int, default=1000,
+                        help="number of concurrent lobbies (default: 1000)")
+    parser.add_argument("--rolls", type=int, default=20,
+                        help="rolls per lobby (default: 20)")
+    parser.add_argument("--lobby-size", type=int, default=5,
+                        help="players per lobby (default: 5)")
+    parser.add_argument("--dealers-choice", action="store_true")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import math
+import random
+import bisect
+
+
+# Every primary (or none) + sidearm + shield combination from weapons.json,
+# sorted by cost. Costs are bucketed into brackets of their greatest common
+# divisor, and each bracket stores how many combinations fit, so rolling a
+# loadout for a budget is one lookup and one random index
+class LoadoutTable:
+    def __init__(self, weapons):
+        costs = weapons["costs"]
+        shields = weapons["shields"]
+
+        self.loadouts = []
+        for primary in [""] + weapons["primary"]:
+            for sidearm in weapons["sidearm"]:
+                for shield in shields:
+                    cost = costs.get(primary, 0) + costs[sidearm] + shields[shield]
+                    self.loadouts.append((cost, primary, sidearm, shield))
+        self.loadouts.sort()
+
+        # Each loadout's name, e.g. for the journal
+        self.names = ["%s/%s/%s" % (primary if primary != "" else "No primary", sidearm, shield)
+                      for cost, primary, sidearm, shield in self.loadouts]
+
+        # Budgets in the same bracket afford exactly the same loadouts
+        self.bracket = 0
+        for loadout in self.loadouts:
+            self.bracket = math.gcd(self.bracket, loadout[0])
+        self.bracket = max(self.bracket, 1)
+
+        loadout_costs = [loadout[0] for loadout in self.loadouts]
+        self.fitting_loadouts = []
+        for i in range(self.loadouts[-1][0] // self.bracket + 1):
+            self.fitting_loadouts.append(bisect.bisect_right(
+                loadout_costs, i * self.bracket))
+
+    # Number of loadouts that fit in a budget
+    def count_loadouts(self, budget):
+        if budget < 0:
+            return 0
+
+        return self.fitting_loadouts[min(budget // self.bracket, len(self.fitting_loadouts) - 1)]
+
+    # Rolls a random loadout that fits in a budget, uniformly among those that
+    # do. Returns (cost, primary, sidearm, shield) with primary "" for none, or
+    # None if nothing fits
+    def roll(self, budget, rng=random):
+        count = self.count_loadouts(budget)
+        if count == 0:
+            return None
+
+        return self.loadouts[rng.randrange(count)]
+
+    # Rolls a loadout per player from {player: budget}
+    def roll_lobby(self, budgets, rng=random):
+        loadouts = {}
+        for player_name in budgets:
+            loadouts[player_name] = self.roll(budgets[player_name], rng)
+
+        return loadouts
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+
+from PyQt6.QtWidgets import QApplication
+
+import profiling
+import roulette_engine
+import roulette_gui
+
+
+# Fills and clears the lobby over and over (rolling before each clear, so
+# rows are also reset mid-spin), and reports how the live widget count and
+# allocated memory blocks change. Both should stay flat
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cycles", type=int, default=5000,
+                        help="number of fill/roll/clear cycles (default: 5000)")
+    args, qt_args = parser.parse_known_args()
+
+    profiler = profiling.Profiler(True)
+    app = QApplication(sys.argv[:1] + qt_args)
+    # Churn rolls aren't real results, so they go to a throwaway history
+    history_path = tempfile.mkdtemp(prefix="valo-churn-")
+    vr = roulette_gui.ValoRoulette(
+        profiler, journal_path=os.devnull, is_muted=True, history_path=history_path)
+    window = roulette_gui.MainWindow(vr)
+    lobby = window.widget_lobby
+
+    # Latency samples would grow memory on their own, so don't take them
+    profiler.set_sampling(False)
+
+    player_names = vr.players.keys()
+    for i in range(args.cycles):
+        for j in range(min(roulette_engine.LOBBY_SIZE, len(player_names))):
+            lobby.combo_players.setCurrentText(
+                player_names[(i + j) % len(player_names)])
+            lobby.cb_add_clicked()
+
+        for key in lobby.widget_map_lobby_players:
+            lobby.widget_map_lobby_players[key].cb_roll_clicked()
+        lobby.cb_clear_clicked()
+        app.processEvents()
+    vr.close()
+    shutil.rmtree(history_path)
+
+    report = profiler.get_report()
+    print(json.dumps({
+        "cycles": args.cycles,
+        "gauges": report["gauges"],
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
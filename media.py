@@ -0,0 +1,497 @@
+import json
+import os
+import glob
+import mmap
+import struct
+import heapq
+import hashlib
+import time
+import threading
+
+from PyQt6.QtCore import *
+from PyQt6.QtMultimedia import QSoundEffect
+from PyQt6.QtGui import QPixmap, QImage, QPainter
+
+import assets
+
+# Pixmaps, icon caches and sounds -- everything that needs Qt. Imported on
+# first use through assets, so the data-only path never loads Qt
+
+CLICK_SOUND_PATH = "./res/click.wav"
+ICON_CACHE_PATH = "./.cache/icons"
+
+# Cached icons are raw premultiplied ARGB32 pixels behind a small header
+# (magic, width, height, bytes per line)
+ICON_CACHE_HEADER = struct.Struct("<4sIII")
+ICON_CACHE_MAGIC = b"VRIC"
+
+# The icon atlas is one file holding every pre-scaled icon packed into a single
+# image: a header (magic, index length), a JSON index, then raw premultiplied
+# ARGB32 pixels of the whole atlas
+ICON_ATLAS_PATH = "./.cache/icons.atlas"
+ICON_ATLAS_HEADER = struct.Struct("<4sI")
+ICON_ATLAS_MAGIC = b"VRIA"
+
+icon_atlas = None
+
+
+def load_agent_icons(path, width, height):
+    agent_icons = {}
+    agent_icon_paths = {}
+
+    agent_icon_paths = assets.load_icon_paths(path)
+
+    for key in agent_icon_paths["agents"]:
+        agent_icons[key] = load_icon(
+            agent_icon_paths["agents"][key], width, height)
+
+    return agent_icons
+
+
+def load_weapon_icons(path):
+    weapon_icons = {}
+    weapon_icon_paths = {}
+
+    weapon_icon_paths = assets.load_icon_paths(path)
+
+    for key in weapon_icon_paths["weapons"]:
+        weapon_icons[key] = load_icon(
+            weapon_icon_paths["weapons"][key], 0, 125)
+
+    return weapon_icons
+
+
+# Loads one icon from the atlas, or from the icon cache if the atlas doesn't
+# have it (or it's stale)
+def load_icon(path, width, height):
+    icon = get_icon_atlas().get_icon(path, width, height)
+    if icon is None:
+        icon = load_scaled_icon(path, width, height)
+
+    return icon
+
+
+# Loads icons in the background: decoding and scaling run as QImage work on a
+# thread pool, highest priority first, and each icon is handed to the GUI
+# thread (the only place QPixmaps can be made) through 'icon_loaded' as soon
+# as it's ready. Icons are requested by key (e.g. ("agents", "Jett")); keys
+# sharing a source image and size share one decode
+class IconLoader(QObject):
+    icon_loaded = pyqtSignal(object, QPixmap)
+    image_decoded = pyqtSignal(object, QImage)
+
+    def __init__(self, threads=0):
+        super().__init__()
+        self.pool = QThreadPool()
+        if threads > 0:
+            self.pool.setMaxThreadCount(threads)
+        self.image_decoded.connect(self.cb_image_decoded)
+
+        # GUI thread only: source (path, width, height) of each key, and the
+        # keys waiting on each source
+        self.key_sources = {}
+        self.waiting = {}
+
+        # Shared with the workers, under 'lock': a heap of (-priority, order,
+        # source), the current priority of every queued source (heap entries
+        # that don't match it are stale) and how many workers are running
+        self.lock = threading.Lock()
+        self.queue = []
+        self.queued = {}
+        self.order = 0
+        self.workers = 0
+
+    # Requests an icon. Returns it straight away if it's in the atlas,
+    # otherwise returns None and emits 'icon_loaded' once it's decoded
+    def request(self, key, path, width, height, priority=0):
+        self.discard(key)
+
+        icon = get_icon_atlas().get_icon(path, width, height)
+        if icon is not None:
+            return icon
+
+        # A source already being decoded is queued again, in case its file
+        # changed since that decode started
+        source = (path, width, height)
+        self.key_sources[key] = source
+        if not source in self.waiting:
+            self.waiting[source] = []
+        self.waiting[source].append(key)
+        with self.lock:
+            if source in self.queued:
+                if self.queued[source] < priority:
+                    self.push(source, priority)
+                return None
+
+            self.push(source, priority)
+            is_starting = self.workers < self.pool.maxThreadCount()
+            if is_starting:
+                self.workers += 1
+        if is_starting:
+            self.pool.start(self.run_worker)
+
+        return None
+
+    # Moves a requested icon up the queue, if it hasn't been started yet
+    def prioritize(self, key, priority):
+        if not key in self.key_sources:
+            return
+
+        source = self.key_sources[key]
+        with self.lock:
+            if source in self.queued and self.queued[source] < priority:
+                self.push(source, priority)
+
+    # Forgets a request; the icon is no longer emitted when it's decoded
+    def discard(self, key):
+        source = self.key_sources.pop(key, None)
+        if source is None:
+            return
+
+        self.waiting[source].remove(key)
+        if len(self.waiting[source]) > 0:
+            return
+
+        self.waiting.pop(source)
+        with self.lock:
+            self.queued.pop(source, None)
+
+    # Checks if any requested icons haven't arrived yet
+    def is_loading(self):
+        return len(self.key_sources) > 0
+
+    # Drops everything queued and waits for icons being decoded to finish
+    def stop(self):
+        with self.lock:
+            self.queue.clear()
+            self.queued.clear()
+        self.pool.waitForDone()
+
+    def push(self, source, priority):
+        self.queued[source] = priority
+        heapq.heappush(self.queue, (-priority, self.order, source))
+        self.order += 1
+
+    # Runs on a pool thread: decodes queued icons until there are none left
+    def run_worker(self):
+        while True:
+            with self.lock:
+                source = None
+                while len(self.queue) > 0:
+                    priority, order, candidate = heapq.heappop(self.queue)
+                    if self.queued.get(candidate) == -priority:
+                        self.queued.pop(candidate)
+                        source = candidate
+                        break
+                if source is None:
+                    self.workers -= 1
+                    return
+
+            try:
+                image = load_scaled_image(*source)
+            except OSError:
+                image = QImage()
+            self.image_decoded.emit(source, image)
+
+    # Hands a decoded image to the keys waiting on it. If the source was
+    # queued again meanwhile they keep waiting for that newer decode too
+    def cb_image_decoded(self, source, image):
+        with self.lock:
+            is_queued = source in self.queued
+        if is_queued:
+            keys = list(self.waiting.get(source, []))
+        else:
+            keys = self.waiting.pop(source, [])
+            for key in keys:
+                self.key_sources.pop(key)
+        if image.isNull():
+            return
+
+        icon = QPixmap.fromImage(image)
+        for key in keys:
+            self.icon_loaded.emit(key, icon)
+
+
+# Loads an icon scaled to width x height, or to the given height keeping the
+# aspect ratio if width is 0
+def load_scaled_icon(path, width, height):
+    return QPixmap.fromImage(load_scaled_image(path, width, height))
+
+
+# Scaled images are cached on disk, keyed by source path, mtime, size and
+# target size, so warm starts skip decoding and scaling
+def load_scaled_image(path, width, height):
+    stat = os.stat(path)
+    source_key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    size_key = "%dx%d" % (width, height)
+    version_key = hashlib.sha1(("%d|%d" % (
+        stat.st_mtime_ns, stat.st_size)).encode()).hexdigest()[:8]
+    cache_prefix = os.path.join(ICON_CACHE_PATH, "%s-%s-%s" % (
+        os.path.splitext(os.path.basename(path))[0], source_key, size_key))
+    cache_path = cache_prefix + "-" + version_key + ".icon"
+
+    image = read_cached_icon(cache_path)
+    if image is None:
+        image = QImage(path)
+        if width == 0:
+            image = image.scaled(image.width(), height, Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+        else:
+            image = image.scaled(
+                width, height, transformMode=Qt.TransformationMode.SmoothTransformation)
+        image = image.convertToFormat(
+            QImage.Format.Format_ARGB32_Premultiplied)
+
+        # Drop entries for older versions of the same icon, then cache it.
+        # IconLoader threads may be caching the same icon at the same time
+        for stale_path in glob.glob(glob.escape(cache_prefix) + "-*.icon"):
+            if stale_path == cache_path:
+                continue
+            try:
+                os.remove(stale_path)
+            except FileNotFoundError:
+                pass
+        write_cached_icon(cache_path, image)
+
+    return image
+
+
+# Reads a cached icon, returns None if it's missing or unreadable
+def read_cached_icon(path):
+    if not os.path.exists(path):
+        return None
+
+    cache_file = open(path, "rb")
+    data = cache_file.read()
+    cache_file.close()
+
+    if len(data) < ICON_CACHE_HEADER.size:
+        return None
+    magic, width, height, bytes_per_line = ICON_CACHE_HEADER.unpack_from(data)
+    if magic != ICON_CACHE_MAGIC or len(data) != ICON_CACHE_HEADER.size + bytes_per_line * height:
+        return None
+
+    # QImage doesn't own the buffer -- copy() so it outlives 'data'
+    return QImage(data[ICON_CACHE_HEADER.size:], width, height, bytes_per_line,
+                  QImage.Format.Format_ARGB32_Premultiplied).copy()
+
+
+# Writes an icon to the cache (via a temp file per thread, so readers never see
+# half of it)
+def write_cached_icon(path, image):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    temp_path = "%s.%d.tmp" % (path, threading.get_ident())
+    cache_file = open(temp_path, "wb")
+    cache_file.write(ICON_CACHE_HEADER.pack(ICON_CACHE_MAGIC, image.width(),
+                                            image.height(), image.bytesPerLine()))
+    cache_file.write(image.constBits().asstring(image.sizeInBytes()))
+    cache_file.close()
+    os.replace(temp_path, path)
+
+
+# Icons packed into one image, handed out as QPixmap regions
+class IconAtlas:
+    def __init__(self, index, pixels):
+        self.index = index
+
+        # The image reads 'pixels' (a view into the mapped atlas file) in place
+        # and the pixmap may share it rather than copy it, so keep it alive
+        self.pixels = pixels
+        self.pixmap = QPixmap()
+
+        # One pixmap per icon, cut out the first time it's asked for and
+        # handed out shared (QPixmap is implicitly shared) after that
+        self.icons = {}
+        if len(pixels) > 0:
+            self.pixmap = QPixmap.fromImage(QImage(pixels, index["width"], index["height"],
+                                                   index["bytes_per_line"], QImage.Format.Format_ARGB32_Premultiplied))
+
+    # Returns the atlas's icon, or None if the atlas doesn't have it at that
+    # size or the source image changed since the atlas was built
+    def get_icon(self, path, width, height):
+        key = get_icon_atlas_key(path, width, height)
+        if not key in self.index["icons"]:
+            return None
+
+        entry = self.index["icons"][key]
+        stat = os.stat(path)
+        if entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            return None
+
+        if not key in self.icons:
+            self.icons[key] = self.pixmap.copy(
+                entry["x"], entry["y"], entry["width"], entry["height"])
+
+        return self.icons[key]
+
+
+def get_icon_atlas_key(path, width, height):
+    return "%s|%dx%d" % (os.path.normpath(path), width, height)
+
+
+# Returns the icon atlas, loading it on first use (empty if it isn't built)
+def get_icon_atlas():
+    global icon_atlas
+
+    if icon_atlas is None:
+        icon_atlas = load_icon_atlas(ICON_ATLAS_PATH)
+
+    return icon_atlas
+
+
+def load_icon_atlas(path):
+    if not os.path.exists(path):
+        return IconAtlas({"icons": {}}, b"")
+
+    # Map the file once, read the index out of it and hand the pixels to the
+    # atlas as a view into the mapping (which stays open while it's in use)
+    atlas_file = open(path, "rb")
+    if os.fstat(atlas_file.fileno()).st_size < ICON_ATLAS_HEADER.size:
+        atlas_file.close()
+        return IconAtlas({"icons": {}}, b"")
+    data = mmap.mmap(atlas_file.fileno(), 0, access=mmap.ACCESS_READ)
+    atlas_file.close()
+
+    magic, index_length = ICON_ATLAS_HEADER.unpack_from(data)
+    if magic != ICON_ATLAS_MAGIC:
+        data.close()
+        return IconAtlas({"icons": {}}, b"")
+
+    # A damaged or cut short atlas is left unused, like a bad cached icon, so
+    # every icon loads from its own file again
+    index_end = ICON_ATLAS_HEADER.size + index_length
+    try:
+        index = json.loads(data[ICON_ATLAS_HEADER.size:index_end])
+        size = index["bytes_per_line"] * index["height"]
+        is_valid = (isinstance(index["icons"], dict) and index["width"] > 0 and index["height"] > 0 and
+                    index["bytes_per_line"] >= index["width"] * 4)
+    except (ValueError, KeyError, TypeError):
+        is_valid = False
+    if not is_valid:
+        data.close()
+        return IconAtlas({"icons": {}}, b"")
+
+    pixels = memoryview(data)[index_end:index_end + size]
+    if len(pixels) != size:
+        pixels.release()
+        data.close()
+        return IconAtlas({"icons": {}}, b"")
+
+    return IconAtlas(index, pixels)
+
+
+# Packs icons into one atlas file. 'icons' is a list of (path, width, height)
+def save_icon_atlas(icons, path, max_width=2048):
+    images = []
+    for icon in icons:
+        images.append((icon, load_scaled_image(*icon)))
+
+    # Shelf packing: tallest first, left to right, new shelf when a row is full
+    images.sort(key=lambda item: item[1].height(), reverse=True)
+    index = {"icons": {}}
+    x = 0
+    y = 0
+    shelf_height = 0
+    atlas_width = 0
+    for (icon_path, width, height), image in images:
+        if x + image.width() > max_width:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+
+        stat = os.stat(icon_path)
+        index["icons"][get_icon_atlas_key(icon_path, width, height)] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "x": x,
+            "y": y,
+            "width": image.width(),
+            "height": image.height(),
+        }
+        x += image.width()
+        shelf_height = max(shelf_height, image.height())
+        atlas_width = max(atlas_width, x)
+
+    atlas = QImage(max(atlas_width, 1), max(y + shelf_height, 1),
+                   QImage.Format.Format_ARGB32_Premultiplied)
+    atlas.fill(0)
+    painter = QPainter(atlas)
+    painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+    for (icon_path, width, height), image in images:
+        entry = index["icons"][get_icon_atlas_key(icon_path, width, height)]
+        painter.drawImage(entry["x"], entry["y"], image)
+    painter.end()
+
+    index["width"] = atlas.width()
+    index["height"] = atlas.height()
+    index["bytes_per_line"] = atlas.bytesPerLine()
+    index_data = json.dumps(index).encode()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    atlas_file = open(temp_path, "wb")
+    atlas_file.write(ICON_ATLAS_HEADER.pack(ICON_ATLAS_MAGIC, len(index_data)))
+    atlas_file.write(index_data)
+    atlas_file.write(atlas.constBits().asstring(atlas.sizeInBytes()))
+    atlas_file.close()
+    os.replace(temp_path, path)
+
+
+# Plays one short sound on a few preloaded voices, so overlapping plays don't
+# cut each other off. Voices are used round-robin (the oldest is restarted
+# once they're all busy), and plays within COALESCE_SECONDS of the last one
+# -- e.g. several wheels ticking on the same frame -- are merged into it
+class VoicePool:
+    COALESCE_SECONDS = 1 / 60
+
+    def __init__(self, path, voices=4, volume=0.25, profiler=None):
+        self.profiler = profiler
+        self.is_muted = False
+        self.last_play_time = None
+
+        self.voices = []
+        self.play_times = []
+        self.next_voice = 0
+        for i in range(max(voices, 1)):
+            voice = QSoundEffect()
+            voice.setSource(QUrl.fromLocalFile(path))
+            voice.setVolume(volume)
+            voice.playingChanged.connect(
+                lambda i=i: self.cb_voice_playing_changed(i))
+            self.voices.append(voice)
+            self.play_times.append(None)
+
+    def play(self):
+        if self.is_muted:
+            return
+
+        now = time.perf_counter()
+        if self.last_play_time is not None and now - self.last_play_time < self.COALESCE_SECONDS:
+            return
+        self.last_play_time = now
+
+        voice = self.voices[self.next_voice]
+        if voice.isPlaying():
+            voice.stop()
+        self.play_times[self.next_voice] = now
+        voice.play()
+        self.next_voice = (self.next_voice + 1) % len(self.voices)
+
+    # Records how long a voice took to actually start after play()
+    def cb_voice_playing_changed(self, i):
+        if not self.voices[i].isPlaying() or self.play_times[i] is None:
+            return
+
+        if self.profiler is not None:
+            self.profiler.record(
+                "tick_to_audio", time.perf_counter() - self.play_times[i])
+        self.play_times[i] = None
+
+
+def load_sounds(voices=4, profiler=None):
+    sounds = {}
+
+    sounds["click"] = VoicePool(CLICK_SOUND_PATH, voices, 0.25, profiler)
+
+    return sounds
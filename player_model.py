@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import itertools
+
+# Distinct agent pool layouts AgentTable keeps for converting players from and
+# to players.json, each way
+MAX_CACHED_LAYOUTS = 256
+
+# Per-player agent weights are relative to a normal agent's (1.0), clamped to
+# [0, MAX_AGENT_WEIGHT]
+MAX_AGENT_WEIGHT = 4.0
+
+
+# Interned agent names. An agent's id is its bit in every Player's masks, so
+# all players share this one table: the agents in schema.json first (in its
+# order), then any other agent names as they're first seen
+class AgentTable:
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.bits = []
+
+        # Most players list the same agents in the same order, so each layout
+        # is only worked out once: (bits, mask) by tuple of agent names for
+        # reading, and (names, bits) by mask for writing
+        self.layouts = {}
+        self.listings = {}
+
+    # Returns the id of an agent, adding it if it's new
+    def intern(self, agent_name):
+        agent_id = self.ids.get(agent_name)
+        if agent_id is None:
+            agent_id = len(self.names)
+            self.ids[agent_name] = agent_id
+            self.names.append(sys.intern(agent_name))
+            self.bits.append(1 << agent_id)
+
+        return agent_id
+
+    # Returns the names of the agents in a mask, in id order
+    def get_names(self, mask):
+        names = []
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            names.append(self.names[bit.bit_length() - 1])
+
+        return names
+
+    # Returns the bits of the agents in 'agent_pool' (in its order) and their
+    # mask, adding any new agents. Names are distinct, so summing their bits
+    # is the same as or-ing them
+    def get_layout(self, agent_pool):
+        order = tuple(agent_pool)
+        layout = self.layouts.get(order)
+        if layout is None:
+            if len(self.layouts) >= MAX_CACHED_LAYOUTS:
+                self.layouts.clear()
+            bits = [self.bits[self.intern(key)] for key in order]
+            layout = (bits, sum(bits))
+            self.layouts[order] = layout
+
+        return layout
+
+    # Returns the names and bits of the agents in a mask, in id order
+    def get_listing(self, mask):
+        listing = self.listings.get(mask)
+        if listing is None:
+            if len(self.listings) >= MAX_CACHED_LAYOUTS:
+                self.listings.clear()
+            names = self.get_names(mask)
+            listing = (names, [self.bits[self.ids[key]] for key in names])
+            self.listings[mask] = listing
+
+        return listing
+
+
+AGENTS = AgentTable()
+
+
+# Interns any agents in 'path' (schema.json) not seen yet. Loaded before any
+# players, so ids follow the schema's order; loading it again after it changes
+# only appends new agents
+def load_agents(path):
+    if not os.path.exists(path):
+        return
+
+    schema_file = open(path, "r")
+    schema = json.load(schema_file)
+    schema_file.close()
+
+    for key in schema["agent_pool"]:
+        AGENTS.intern(key)
+
+
+def clamp_weight(weight):
+    return min(max(float(weight), 0.0), MAX_AGENT_WEIGHT)
+
+
+# One player: their agent pool as two masks over AGENTS ('listed' for agents
+# with an entry in players.json at all, 'pool' for the ones set to true), the
+# agent they currently have selected, and {agent: weight} for agents they
+# don't weigh 1.0 (None if there are none, as for most players)
+class Player:
+    __slots__ = ("pool", "listed", "selected", "weights")
+
+    def __init__(self, pool=0, selected="", listed=None, weights=None):
+        self.pool = pool
+        self.listed = pool if listed is None else listed | pool
+        self.selected = selected
+        self.weights = weights
+
+    # Checks if an agent is in the player's pool
+    def has_agent(self, agent_name):
+        agent_id = AGENTS.ids.get(agent_name)
+        return agent_id is not None and self.pool >> agent_id & 1 == 1
+
+    # Adds or removes an agent from the player's pool
+    def set_agent(self, agent_name, state):
+        bit = 1 << AGENTS.intern(agent_name)
+        self.listed |= bit
+        if state:
+            self.pool |= bit
+        else:
+            self.pool &= ~bit
+
+    # Returns the names of the agents in the player's pool, in id order
+    def get_agent_names(self):
+        return AGENTS.get_names(self.pool)
+
+    def get_weight(self, agent_name):
+        if self.weights is None:
+            return 1.0
+
+        return self.weights.get(agent_name, 1.0)
+
+    # Sets how likely the player is to roll an agent, relative to 1.0
+    def set_weight(self, agent_name, weight):
+        weight = clamp_weight(weight)
+        if weight != 1.0:
+            if self.weights is None:
+                self.weights = {}
+            self.weights[sys.intern(agent_name)] = weight
+        elif self.weights is not None:
+            self.weights.pop(agent_name, None)
+            if len(self.weights) == 0:
+                self.weights = None
+
+    def copy(self):
+        return Player(self.pool, self.selected, self.listed,
+                      None if self.weights is None else dict(self.weights))
+
+    # Returns the player as a players.json-style dict
+    # ({"agent_pool": {agent: bool}, "selected": agent}, plus
+    # "weights": {agent: weight} if any agent isn't weighted 1.0)
+    def to_dict(self):
+        names, bits = AGENTS.get_listing(self.listed)
+        agent_pool = dict(zip(names, map(bool, map(self.pool.__and__, bits))))
+
+        data = {"agent_pool": agent_pool, "selected": self.selected}
+        if self.weights is not None:
+            data["weights"] = dict(self.weights)
+
+        return data
+
+
+# Returns a Player from a players.json-style dict
+def player_from_dict(data):
+    bits, listed = AGENTS.get_layout(data["agent_pool"])
+    pool = sum(itertools.compress(bits, data["agent_pool"].values()))
+    player = Player(pool, sys.intern(data["selected"]), listed)
+
+    weights = data.get("weights")
+    if weights:
+        for key in weights:
+            player.set_weight(key, weights[key])
+
+    return player
+
+
+# Converts a whole players.json dict ({name: player}) to Players and back
+def players_from_dict(data):
+    players = {}
+    for key in data:
+        players[key] = player_from_dict(data[key])
+
+    return players
+
+
+def players_to_dict(players):
+    data = {}
+    for key in players:
+        data[key] = players[key].to_dict()
+
+    return data
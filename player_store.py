@@ -0,0 +1,192 @@
+import os
+import json
+import sqlite3
+import urllib.parse
+
+import player_model
+
+
+# SQLite-backed player data. Reads like a {name: player_model.Player} dict but
+# only loads players when they're looked up, and every change is written as
+# its own atomic transaction instead of rewriting the whole file. A read-only
+# store never writes to 'path': it's opened read-only if it exists, otherwise
+# players are imported into a store in memory
+class PlayerStore:
+    def __init__(self, path, import_path=None, is_read_only=False):
+        is_new = not os.path.exists(path)
+
+        if is_read_only and not is_new:
+            self.connection = sqlite3.connect("file:%s?mode=ro" % urllib.parse.quote(
+                os.path.abspath(path)), uri=True)
+        else:
+            self.connection = sqlite3.connect(":memory:" if is_read_only else path)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=FULL")
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS players (name TEXT PRIMARY KEY, selected TEXT NOT NULL DEFAULT '')")
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS agent_pools (player TEXT NOT NULL, agent TEXT NOT NULL, "
+                    "available INTEGER NOT NULL, weight REAL, PRIMARY KEY (player, agent)) WITHOUT ROWID")
+
+        # Stores from before agent weights don't have the column (NULL is the
+        # default weight). Read-only ones are read as if every weight was
+        # the default
+        self.weight_column = "weight"
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(agent_pools)")]
+        if not "weight" in columns:
+            if is_read_only:
+                self.weight_column = "NULL"
+            else:
+                with self.connection:
+                    self.connection.execute("ALTER TABLE agent_pools ADD COLUMN weight REAL")
+
+        # Players loaded so far
+        self.cache = {}
+
+        # Bumped by SQLite whenever another connection commits (see reload)
+        self.data_version = self.get_data_version()
+
+        # Bring over an existing players.json the first time
+        if is_new and import_path is not None and os.path.exists(import_path):
+            import_file = open(import_path, "r")
+            players = player_model.players_from_dict(json.load(import_file))
+            import_file.close()
+
+            with self.connection:
+                for key in players:
+                    self.insert_player(key, players[key])
+
+    def __contains__(self, player_name):
+        if player_name in self.cache:
+            return True
+
+        return self.connection.execute(
+            "SELECT 1 FROM players WHERE name = ?", (player_name,)).fetchone() is not None
+
+    def __iter__(self):
+        for row in self.connection.execute("SELECT name FROM players ORDER BY name").fetchall():
+            yield row[0]
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+    def __getitem__(self, player_name):
+        if player_name in self.cache:
+            return self.cache[player_name]
+
+        player = self.read_player(player_name)
+        if player is None:
+            raise KeyError(player_name)
+        self.cache[player_name] = player
+
+        return player
+
+    # Reads a player from the database, None if there isn't one
+    def read_player(self, player_name):
+        row = self.connection.execute(
+            "SELECT selected FROM players WHERE name = ?", (player_name,)).fetchone()
+        if row is None:
+            return None
+
+        player = player_model.Player(0, row[0])
+        for agent, available, weight in self.connection.execute(
+                "SELECT agent, available, %s FROM agent_pools WHERE player = ?" % self.weight_column,
+                (player_name,)):
+            player.set_agent(agent, available == 1)
+            if weight is not None:
+                player.set_weight(agent, weight)
+
+        return player
+
+    def get_data_version(self):
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    # Picks up changes committed through other connections (e.g. the editor
+    # while the roulette is open). Loaded players are updated in place, so
+    # anything holding them sees the new pools; their selections are left
+    # alone. Returns the names of loaded players that changed or were removed,
+    # or None if nothing was committed since the last call
+    def reload(self):
+        data_version = self.get_data_version()
+        if data_version == self.data_version:
+            return None
+        self.data_version = data_version
+
+        changed = []
+        for key in list(self.cache):
+            player = self.read_player(key)
+            if player is None:
+                self.cache.pop(key)
+                changed.append(key)
+                continue
+
+            cached = self.cache[key]
+            if player.pool != cached.pool or player.listed != cached.listed or player.weights != cached.weights:
+                cached.pool = player.pool
+                cached.listed = player.listed
+                cached.weights = player.weights
+                changed.append(key)
+
+        return changed
+
+    def keys(self):
+        return list(self)
+
+    def insert_player(self, player_name, player):
+        self.connection.execute(
+            "INSERT INTO players (name, selected) VALUES (?, ?)", (player_name, player.selected))
+        self.connection.executemany(
+            "INSERT INTO agent_pools (player, agent, available, weight) VALUES (?, ?, ?, ?)",
+            [(player_name, key, 1 if player.has_agent(key) else 0,
+              None if player.weights is None else player.weights.get(key))
+             for key in player_model.AGENTS.get_names(player.listed)])
+
+    # Adds a player (copying 'player', a player_model.Player)
+    def add_player(self, player_name, player):
+        with self.connection:
+            self.insert_player(player_name, player)
+        self.cache.pop(player_name, None)
+
+    # Removes a player
+    def remove_player(self, player_name):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM agent_pools WHERE player = ?", (player_name,))
+            self.connection.execute(
+                "DELETE FROM players WHERE name = ?", (player_name,))
+        self.cache.pop(player_name, None)
+
+    # Sets whether an agent is in a player's pool
+    def set_agent_availability(self, player_name, agent_name, state):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO agent_pools (player, agent, available) VALUES (?, ?, ?) "
+                "ON CONFLICT (player, agent) DO UPDATE SET available = excluded.available",
+                (player_name, agent_name, 1 if state else 0))
+        if player_name in self.cache:
+            self.cache[player_name].set_agent(agent_name, state)
+
+    # Sets how likely a player is to roll an agent (see
+    # player_model.Player.set_weight)
+    def set_agent_weight(self, player_name, agent_name, weight):
+        weight = player_model.clamp_weight(weight)
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO agent_pools (player, agent, available, weight) VALUES (?, ?, 0, ?) "
+                "ON CONFLICT (player, agent) DO UPDATE SET weight = excluded.weight",
+                (player_name, agent_name, None if weight == 1.0 else weight))
+        if player_name in self.cache:
+            self.cache[player_name].listed |= 1 << player_model.AGENTS.intern(agent_name)
+            self.cache[player_name].set_weight(agent_name, weight)
+
+    # Returns every player as a {name: player_model.Player} dict
+    def to_dict(self):
+        players = {}
+        for key in self:
+            players[key] = self[key]
+
+        return players
+
+    def close(self):
+        self.connection.close()
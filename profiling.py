@@ -0,0 +1,181 @@
+import sys
+import json
+import time
+import contextlib
+
+from PyQt6.QtCore import QObject, QEvent, QTimer
+
+
+# Records startup phase timings, one-off marks (e.g. first paint) and per-call
+# latency samples, and dumps them as a JSON report. Does nothing when disabled
+class Profiler:
+    def __init__(self, enabled):
+        self.is_enabled = enabled
+        self.start_time = time.perf_counter()
+
+        self.phases = []
+        self.marks = {}
+        self.samples = {}
+        self.gauges = {}
+
+        # Whether latency samples are taken (see set_sampling)
+        self.is_sampling = True
+
+        self.pending_repaints = {}
+        self.paint_watcher = None
+
+    # Times a block of code, and counts the memory blocks it left allocated
+    @contextlib.contextmanager
+    def phase(self, name):
+        if not self.is_enabled:
+            yield
+            return
+
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        yield
+        self.phases.append({
+            "name": name,
+            "seconds": time.perf_counter() - start,
+            "allocated_blocks": sys.getallocatedblocks() - blocks,
+        })
+
+    # Records the time since profiling started, first call only
+    def mark(self, name):
+        if not self.is_enabled or name in self.marks:
+            return
+
+        self.marks[name] = time.perf_counter() - self.start_time
+
+    # Turns latency samples (record, wrap, expect_repaint) on or off, e.g. for
+    # long runs where keeping every sample would grow memory on its own.
+    # Phases, marks and gauges are still taken
+    def set_sampling(self, is_sampling):
+        self.is_sampling = is_sampling
+
+    # Records one latency sample
+    def record(self, name, seconds):
+        if not self.is_enabled or not self.is_sampling:
+            return
+
+        if not name in self.samples:
+            self.samples[name] = []
+        self.samples[name].append(seconds)
+
+    # Records one reading of a level that should stay flat (e.g. live widget
+    # count, allocated memory blocks). Only running stats are kept, so the
+    # readings don't grow memory themselves
+    def gauge(self, name, value):
+        if not self.is_enabled:
+            return
+
+        if not name in self.gauges:
+            self.gauges[name] = {"count": 0, "first": value,
+                                 "last": value, "min": value, "max": value}
+        gauge = self.gauges[name]
+        gauge["count"] += 1
+        gauge["last"] = value
+        gauge["min"] = min(gauge["min"], value)
+        gauge["max"] = max(gauge["max"], value)
+
+    # Returns 'function' wrapped to record a latency sample per call
+    def wrap(self, name, function):
+        if not self.is_enabled:
+            return function
+
+        def timed(*args, **kwargs):
+            if not self.is_sampling:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.record(name, time.perf_counter() - start)
+            return result
+
+        return timed
+
+    # Marks 'first_paint' when 'widget' is first painted
+    def watch_first_paint(self, widget):
+        if not self.is_enabled:
+            return
+
+        self.get_paint_watcher().first_paint_widgets.add(widget)
+        widget.installEventFilter(self.get_paint_watcher())
+
+    # Records a 'name' sample once 'widget' has been repainted, e.g. after an
+    # icon change
+    def expect_repaint(self, name, widget):
+        if not self.is_enabled or not self.is_sampling:
+            return
+
+        if not widget in self.pending_repaints:
+            widget.installEventFilter(self.get_paint_watcher())
+        self.pending_repaints[widget] = (name, time.perf_counter())
+
+    def get_paint_watcher(self):
+        if self.paint_watcher is None:
+            self.paint_watcher = PaintWatcher(self)
+
+        return self.paint_watcher
+
+    # Called by PaintWatcher after a watched widget is painted
+    def on_paint(self, widget):
+        if widget in self.paint_watcher.first_paint_widgets:
+            self.paint_watcher.first_paint_widgets.discard(widget)
+            self.mark("first_paint")
+
+        if widget in self.pending_repaints:
+            name, start = self.pending_repaints.pop(widget)
+            self.record(name, time.perf_counter() - start)
+
+    def get_report(self):
+        report = {
+            "phases": self.phases,
+            "marks": self.marks,
+            "samples": {},
+            "gauges": {},
+        }
+
+        for name in self.samples:
+            samples = sorted(self.samples[name])
+            report["samples"][name] = {
+                "count": len(samples),
+                "mean": sum(samples) / len(samples),
+                "p50": samples[len(samples) // 2],
+                "p99": samples[min(len(samples) - 1, len(samples) * 99 // 100)],
+                "max": samples[-1],
+            }
+
+        for name in self.gauges:
+            report["gauges"][name] = dict(self.gauges[name])
+
+        return report
+
+    # Writes the report to 'path', or stdout if path is '-'
+    def save_report(self, path):
+        if not self.is_enabled:
+            return
+
+        output_str = json.dumps(self.get_report(), indent=4)
+        if path == "-":
+            print(output_str)
+            return
+
+        report_file = open(path, "w")
+        report_file.write(output_str)
+        report_file.close()
+
+
+class PaintWatcher(QObject):
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler_ = profiler
+        self.first_paint_widgets = set()
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.Paint:
+            # The paint runs once the event is let through, so the timestamp
+            # is taken from the event loop straight after it
+            QTimer.singleShot(0, lambda: self.profiler_.on_paint(watched))
+
+        return False
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import time
+import argparse
+
+import journal
+
+
+# Re-draws every roll in one or more journals from their seeds, and reports
+# any that don't match what was logged (the draw, or the value it lands on).
+# Exits non-zero if any don't
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", metavar="JOURNAL",
+                        help="journal files to verify")
+    parser.add_argument("--dump", type=int, default=0, metavar="N",
+                        help="also print the first N rolls of each journal")
+    parser.add_argument("--draws-only", action="store_true",
+                        help="only re-draw the rolls, without checking the values they land on")
+    args = parser.parse_args()
+
+    is_verified = True
+    for path in args.paths:
+        start = time.perf_counter()
+        count, mismatches, unchecked = journal.verify_journal(path, not args.draws_only)
+        seconds = time.perf_counter() - start
+
+        report = {
+            "path": path,
+            "rolls": count,
+            "mismatches": len(mismatches),
+            "first_mismatches": mismatches[:10],
+            "unchecked_values": unchecked,
+            "seconds": seconds,
+            "rolls_per_second": count / seconds if seconds > 0 else 0,
+        }
+
+        if args.dump > 0:
+            seed, stream_names, value_names, rolls = journal.read_journal(path)
+            report["seed"] = seed
+            report["rolls_dump"] = []
+            for stream_id, bound, draw, value_id in rolls[:args.dump]:
+                report["rolls_dump"].append({
+                    "stream": stream_names[stream_id],
+                    "bound": bound,
+                    "draw": draw,
+                    "value": value_names[value_id],
+                })
+
+        print(json.dumps(report, indent=4))
+        if len(mismatches) > 0:
+            is_verified = False
+
+    sys.exit(0 if is_verified else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,764 @@
+import os
+import sys
+import time
+import math
+import bisect
+import sqlite3
+
+from PyQt6.QtCore import *
+from PyQt6.QtGui import *
+from PyQt6.QtWidgets import *
+from PyQt6.QtMultimedia import QSoundEffect
+
+import assets
+import comp_engine
+import file_watcher
+import history
+import journal
+import loadout
+import player_model
+import profiling
+import roulette_engine
+import spin_timing
+
+# Size icons are loaded at, by kind in icons.json (width 0 keeps the aspect
+# ratio)
+ICON_SIZES = {"agents": (125, 125), "weapons": (0, 125)}
+
+# Icons load in the background in this order: agents someone in the lobby can
+# roll, then the other agents, then weapons
+ICON_PRIORITY_LOBBY = 2
+ICON_PRIORITIES = {"agents": 1, "weapons": 0}
+
+
+# One spinning roulette wheel
+class Spinner:
+    def __init__(self, on_tick, on_finished):
+        self.on_tick = on_tick
+        self.on_finished = on_finished
+
+        self.start = time.monotonic()
+        self.tick = 0
+        self.dropped_ticks = 0
+
+
+# Drives every spinning wheel from a single timer on the GUI thread. A wheel
+# ticks at spin_timing's tick times, fast at first and then slowing down.
+# Ticks are placed by elapsed time rather than by delays between them, so a
+# late timer never pushes the rest of the spin back -- if it's late enough to
+# miss a tick, that tick is skipped
+class SpinScheduler(QObject):
+    def __init__(self, profiler=None):
+        super().__init__()
+        self.profiler = profiler if profiler else profiling.Profiler(False)
+        self.spinners = {}
+
+        # Seconds into the spin of each tick, then of the end of the spin
+        self.tick_times = spin_timing.get_tick_times()
+
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.cb_timer_timeout)
+
+    # Starts spinning; on_tick is called up to SPIN_TICKS times, then on_finished
+    def start(self, owner, on_tick, on_finished):
+        self.spinners[owner] = Spinner(on_tick, on_finished)
+        self.cb_timer_timeout()
+
+    # Stops a wheel without calling on_finished
+    def stop(self, owner):
+        self.spinners.pop(owner, None)
+
+    def is_spinning(self, owner):
+        return owner in self.spinners
+
+    # Advances every wheel to where it should be by now, then sleeps until the
+    # next tick is due. Records how late each tick is ('spin_tick_jitter') and
+    # how many ticks each spin skipped ('spin_dropped_ticks')
+    def cb_timer_timeout(self):
+        now = time.monotonic()
+
+        for owner in list(self.spinners):
+            spinner = self.spinners[owner]
+            elapsed = now - spinner.start
+            latest = bisect.bisect_right(self.tick_times, elapsed) - 1
+            if latest < spinner.tick:
+                continue
+
+            if latest == spin_timing.SPIN_TICKS:
+                spinner.dropped_ticks += spin_timing.SPIN_TICKS - spinner.tick
+                self.spinners.pop(owner)
+                self.profiler.record(
+                    "spin_dropped_ticks", spinner.dropped_ticks)
+                spinner.on_finished()
+                continue
+
+            # Only show the latest due tick
+            spinner.dropped_ticks += latest - spinner.tick
+            spinner.tick = latest + 1
+            self.profiler.record(
+                "spin_tick_jitter", elapsed - self.tick_times[latest])
+            spinner.on_tick()
+
+        if len(self.spinners) > 0:
+            next_due = min(spinner.start + self.tick_times[spinner.tick]
+                           for spinner in self.spinners.values())
+            self.timer.start(max(0, math.ceil((next_due - now) * 1000)))
+
+
+class WeaponWidget(QWidget):
+    def __init__(self, vr, weapon_class):
+        super().__init__()
+        self.vr_ = vr
+        self.weapon_class = weapon_class
+
+        self.current_weapon = ""
+        self.final_weapon = None
+
+        self.layout = QVBoxLayout()
+        self.icon_weapon = QLabel("?",)
+        self.icon_weapon.setFont(self.vr_.font_large)
+        self.icon_weapon.setFixedSize(220, 220)
+        self.icon_weapon.setStyleSheet("border: 1px solid #aaaaaa")
+        self.icon_weapon.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.button_roll = QPushButton("Roll " + self.weapon_class)
+
+        self.button_roll.clicked.connect(lambda: self.cb_roll_clicked())
+
+        self.layout.addWidget(self.icon_weapon)
+        self.layout.addWidget(self.button_roll)
+        self.setLayout(self.layout)
+
+    # If final_weapon is given the wheel lands on it ("" for no weapon)
+    def cb_roll_clicked(self, final_weapon=None):
+        if self.vr_.spin_scheduler.is_spinning(self):
+            return
+
+        # 'Spin' through different guns
+        self.final_weapon = final_weapon
+        self.button_roll.setEnabled(False)
+        self.vr_.spin_scheduler.start(
+            self, self.cb_spinner_tick, self.cb_spinner_finished)
+
+    def cb_spinner_tick(self):
+        self.set_random_weapon()
+        self.vr_.sounds["click"].play()
+
+    def cb_spinner_finished(self):
+        if self.final_weapon is not None:
+            self.set_weapon(self.final_weapon)
+        self.button_roll.setEnabled(True)
+        self.vr_.record_weapon(self.weapon_class, self.current_weapon)
+        self.vr_.journal.flush()
+        self.vr_.history.flush()
+
+    def set_random_weapon(self):
+        self.set_weapon(self.vr_.get_random_weapon(
+            self.weapon_class, self.vr_.weapons[self.weapon_class], self.current_weapon))
+
+    # Shows a weapon, "None" for "" or "?" until its icon is loaded
+    def set_weapon(self, weapon):
+        self.current_weapon = weapon
+
+        if weapon == "":
+            self.icon_weapon.setText("None")
+            return
+        if not weapon in self.vr_.weapon_icons:
+            self.icon_weapon.setText("?")
+            return
+        self.icon_weapon.setPixmap(
+            self.vr_.weapon_icons[self.current_weapon])
+
+
+# One lobby row. LobbyWidget keeps a fixed set of these and binds them to
+# players as they join, rather than creating a new one per player
+class LobbyPlayerWidget(QWidget):
+    def __init__(self, vr):
+        super().__init__()
+        self.vr_ = vr  # Reference to main ValoRoulette class
+        self.player_name = None
+        self.agent_name = None
+
+        # Set up player widget
+        self.layout = QHBoxLayout()
+        self.label_player = QLabel()
+        self.label_player.setMinimumHeight(125)
+        self.label_player.setFont(self.vr_.font_large)
+        self.button_roll = QPushButton("Roll")
+        self.button_roll.setMinimumHeight(50)
+        self.final_agent = None
+
+        self.icon_agent = QLabel("?")
+        self.icon_agent.setFont(self.vr_.font_large)
+        self.icon_agent.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.icon_agent.setMinimumSize(125, 125)
+        self.icon_agent.setStyleSheet("border: 1px solid #aaaaaa")
+
+        # Connect 'clicked' signals to their callback functions
+        self.button_roll.clicked.connect(lambda: self.cb_roll_clicked())
+
+        self.layout.addWidget(self.label_player)
+        self.layout.addWidget(self.button_roll)
+        self.layout.addWidget(self.icon_agent)
+        self.layout.setStretch(0, 1)
+        self.setLayout(self.layout)
+        self.hide()
+
+    # Shows this row for a player who just joined the lobby
+    def bind(self, player_name):
+        self.player_name = player_name
+        self.label_player.setText(player_name)
+        self.show()
+
+    # Stops any spin and hides this row, ready to be bound again
+    def reset(self):
+        self.vr_.spin_scheduler.stop(self)
+        self.player_name = None
+        self.agent_name = None
+        self.final_agent = None
+        self.label_player.setText("")
+        self.icon_agent.clear()
+        self.icon_agent.setText("?")
+        self.button_roll.setEnabled(True)
+        self.hide()
+
+    # Called when 'Roll' button is clicked
+    # If final_agent is given (already set in the lobby), the wheel only shows
+    # random agents and lands on it
+    def cb_roll_clicked(self, final_agent=None):
+        if self.vr_.spin_scheduler.is_spinning(self):
+            return
+
+        # Disable 'roll' button until finished, start spinning
+        self.final_agent = final_agent
+        self.button_roll.setEnabled(False)
+        self.vr_.spin_scheduler.start(
+            self, self.cb_spinner_tick, self.cb_spinner_finished)
+
+    # Called every time roulette wheel 'clicks' -- picks a random agent, displays it
+    def cb_spinner_tick(self):
+        random_agent = self.vr_.get_random_agent(self.player_name)
+
+        # Nothing left to pick from -- keep showing the current agent
+        if random_agent is None:
+            return
+
+        if self.final_agent is None:
+            self.vr_.set_player_agent(self.player_name, random_agent)
+        self.set_agent_icon(random_agent)
+        self.vr_.profiler.expect_repaint("signal_to_repaint", self.icon_agent)
+
+        # Play a click sound! (rows ticking together share one click)
+        self.vr_.sounds["click"].play()
+
+    def cb_spinner_finished(self):
+        if self.final_agent is not None:
+            self.set_agent_icon(self.final_agent)
+        self.button_roll.setEnabled(True)
+        self.vr_.record_agent(self.player_name)
+        self.vr_.journal.flush()
+        self.vr_.history.flush()
+
+    # Sets the agent icon ("?" until it's loaded)
+    def set_agent_icon(self, agent_name):
+        self.agent_name = agent_name
+        if not agent_name in self.vr_.agent_icons:
+            self.icon_agent.setText("?")
+            return
+        self.icon_agent.setPixmap(self.vr_.agent_icons[agent_name])
+
+
+class LobbyWidget(QWidget):
+    def __init__(self, vr):
+        super().__init__()
+        self.vr_ = vr  # Reference to main ValoRoulette class
+
+        # Main layout
+        self.layout_main = QVBoxLayout()
+        self.layout_main.setAlignment(Qt.AlignmentFlag.AlignTop)
+
+        # Lobby control layout (add/clear players)
+        self.layout_lobby_control = QHBoxLayout()
+        self.combo_players = QComboBox()
+        self.button_add = QPushButton("Add")
+        self.button_clear = QPushButton("Clear")
+        self.button_roll_lobby = QPushButton("Roll lobby")
+        self.checkbox_dealers_choice = QCheckBox("Dealer's Choice")
+        self.checkbox_optimal_comps = QCheckBox("Prefer optimal comp for")
+        self.combo_maps = QComboBox()
+        self.checkbox_no_repeats = QCheckBox("No repeats")
+        self.checkbox_no_repeats.setChecked(self.vr_.is_anti_repeat_enabled)
+        self.checkbox_mute = QCheckBox("Mute")
+        self.checkbox_mute.setChecked(self.vr_.sounds["click"].is_muted)
+
+        self.layout_roulette = QHBoxLayout()
+
+        # Lobby player list layout
+        self.layout_lobby = QVBoxLayout()
+        self.layout_lobby.setAlignment(Qt.AlignmentFlag.AlignTop)
+        self.widget_map_lobby_players = {}
+        self.lobby_player_widgets = []
+        for i in range(roulette_engine.LOBBY_SIZE):
+            self.lobby_player_widgets.append(LobbyPlayerWidget(self.vr_))
+            self.layout_lobby.addWidget(self.lobby_player_widgets[i])
+
+        # Lobby weapons layout
+        self.layout_weapons = QVBoxLayout()
+        self.widget_primary = WeaponWidget(self.vr_, "primary")
+        self.widget_sidearm = WeaponWidget(self.vr_, "sidearm")
+        self.layout_weapons.addWidget(self.widget_primary)
+        self.layout_weapons.addWidget(self.widget_sidearm)
+        self.layout_weapons.setAlignment(Qt.AlignmentFlag.AlignTop)
+
+        # Loadout layout (roll primary + sidearm + shields within a budget)
+        self.layout_loadout = QHBoxLayout()
+        self.spin_credits = QSpinBox()
+        self.spin_credits.setRange(0, 9000)
+        self.spin_credits.setSingleStep(self.vr_.loadouts.bracket)
+        self.spin_credits.setValue(3900)
+        self.spin_credits.setSuffix(" credits")
+        self.button_roll_loadout = QPushButton("Roll loadout")
+        self.label_shields = QLabel()
+        self.label_shields.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.layout_loadout.addWidget(self.spin_credits)
+        self.layout_loadout.addWidget(self.button_roll_loadout)
+        self.layout_weapons.addLayout(self.layout_loadout)
+        self.layout_weapons.addWidget(self.label_shields)
+
+        # Connect 'clicked' signals to their callback functions
+        self.button_add.clicked.connect(self.cb_add_clicked)
+        self.button_clear.clicked.connect(self.cb_clear_clicked)
+        self.button_roll_lobby.clicked.connect(self.cb_roll_lobby_clicked)
+        self.button_roll_loadout.clicked.connect(self.cb_roll_loadout_clicked)
+        self.checkbox_dealers_choice.stateChanged.connect(
+            self.cb_dealers_choice_state_changed)
+        self.checkbox_optimal_comps.stateChanged.connect(
+            self.cb_optimal_comps_state_changed)
+        self.combo_maps.currentTextChanged.connect(
+            self.cb_map_changed)
+        self.checkbox_no_repeats.stateChanged.connect(
+            self.cb_no_repeats_state_changed)
+        self.checkbox_mute.stateChanged.connect(self.cb_mute_state_changed)
+        self.vr_.file_watcher.changed.connect(self.cb_files_changed)
+        self.vr_.icon_loader.icon_loaded.connect(self.cb_icon_loaded)
+
+        # Add widgets to layouts
+        self.layout_lobby_control.addWidget(self.combo_players)
+        self.layout_lobby_control.addWidget(self.button_add)
+        self.layout_lobby_control.addWidget(self.button_clear)
+        self.layout_lobby_control.addWidget(self.button_roll_lobby)
+        self.layout_lobby_control.addWidget(self.checkbox_dealers_choice)
+        self.layout_lobby_control.addWidget(self.checkbox_optimal_comps)
+        self.layout_lobby_control.addWidget(self.combo_maps)
+        self.layout_lobby_control.addWidget(self.checkbox_no_repeats)
+        self.layout_lobby_control.addWidget(self.checkbox_mute)
+        self.layout_lobby_control.setStretch(0, 1)
+
+        # Update combobox from player data & update lobby player list
+        self.populate_player_combobox()
+        self.populate_map_combobox()
+        self.update_lobby_widget()
+
+        # Optimal comps apply to 'Roll lobby'
+        self.checkbox_optimal_comps.setToolTip(
+            "'Roll lobby' picks one of the best comps for the selected map")
+        self.checkbox_no_repeats.setToolTip(
+            "Players don't get the agent they had last game, if they can have anything else")
+
+        # Add player/weapon roulette layouts side-by-side
+        self.layout_roulette.addLayout(self.layout_lobby)
+        self.layout_roulette.addLayout(self.layout_weapons)
+        self.layout_roulette.setStretch(0, 1)
+
+        # Add layouts to main widget
+        self.layout_main.addLayout(self.layout_lobby_control)
+        self.layout_main.addLayout(self.layout_roulette)
+        self.setLayout(self.layout_main)
+
+    # Called when 'Clear' button is clicked
+    def cb_clear_clicked(self):
+        self.vr_.clear_lobby()
+        self.update_lobby_widget()
+
+    # Called when 'Add' button is clicked
+    def cb_add_clicked(self):
+        if len(self.vr_.current_lobby) >= roulette_engine.LOBBY_SIZE:
+            return
+
+        new_player = self.combo_players.currentText()
+        self.vr_.add_player_to_lobby(new_player)
+        self.update_lobby_widget()
+
+    # Called when 'Roll lobby' button is clicked -- picks distinct agents for
+    # the whole lobby up front, then spins every row at once
+    def cb_roll_lobby_clicked(self):
+        for key in self.widget_map_lobby_players:
+            if self.vr_.spin_scheduler.is_spinning(self.widget_map_lobby_players[key]):
+                return
+
+        assignment = self.vr_.roll_lobby()
+        if assignment is None:
+            QMessageBox.warning(self, "Roll lobby",
+                                "Can't give every player a different agent from their pool!")
+            return
+
+        for key in self.widget_map_lobby_players:
+            self.widget_map_lobby_players[key].cb_roll_clicked(
+                assignment[key])
+
+    # Called when 'Roll loadout' button is clicked -- spins both weapons,
+    # landing on a random loadout that fits the budget
+    def cb_roll_loadout_clicked(self):
+        if self.vr_.spin_scheduler.is_spinning(self.widget_primary) or self.vr_.spin_scheduler.is_spinning(self.widget_sidearm):
+            return
+
+        loadout = self.vr_.roll_loadout(
+            self.vr_.loadouts, self.spin_credits.value())
+        if loadout is None:
+            return
+
+        cost, primary, sidearm, shields = loadout
+        self.label_shields.setText("%s (%d credits)" % (shields, cost))
+        self.widget_primary.cb_roll_clicked(primary)
+        self.widget_sidearm.cb_roll_clicked(sidearm)
+
+    def cb_dealers_choice_state_changed(self):
+        self.vr_.is_dealers_choice_enabled = True if self.checkbox_dealers_choice.checkState(
+        ) == Qt.CheckState.Checked else False
+
+    def cb_optimal_comps_state_changed(self):
+        self.vr_.is_optimal_comp_enabled = True if self.checkbox_optimal_comps.checkState(
+        ) == Qt.CheckState.Checked else False
+
+    def cb_map_changed(self, map_name):
+        self.vr_.optimal_comp_map = map_name
+
+    def cb_no_repeats_state_changed(self):
+        self.vr_.is_anti_repeat_enabled = True if self.checkbox_no_repeats.checkState(
+        ) == Qt.CheckState.Checked else False
+
+    def cb_mute_state_changed(self):
+        self.vr_.sounds["click"].is_muted = True if self.checkbox_mute.checkState(
+        ) == Qt.CheckState.Checked else False
+
+    # Called when watched data files change -- applies the changes and
+    # refreshes what shows them, leaving the lobby and its rows as they are
+    def cb_files_changed(self, paths):
+        changed = self.vr_.reload_files(paths)
+        if "players" in changed:
+            self.refresh_player_combobox()
+            self.update_lobby_widget()
+        if "weapons" in changed:
+            self.spin_credits.setSingleStep(self.vr_.loadouts.bracket)
+
+    # Called as each icon finishes loading (after ValoRoulette has stored it)
+    # -- swaps it in wherever it's showing as a placeholder
+    def cb_icon_loaded(self, key, icon):
+        kind, name = key
+        if kind == "agents":
+            for widget in self.lobby_player_widgets:
+                if widget.agent_name == name:
+                    widget.set_agent_icon(name)
+        else:
+            for widget in [self.widget_primary, self.widget_sidearm]:
+                if widget.current_weapon == name:
+                    widget.set_weapon(name)
+
+    # Adds players to the 'players' dropdown menu
+    def populate_player_combobox(self):
+        for key in self.vr_.players:
+            self.combo_players.addItem(key)
+
+    # Brings the 'players' dropdown in line with player data by adding and
+    # removing entries (kept sorted like the store), keeping the current one
+    def refresh_player_combobox(self):
+        player_names = self.vr_.players.keys()
+        player_name_set = set(player_names)
+
+        items = []
+        for i in reversed(range(self.combo_players.count())):
+            if self.combo_players.itemText(i) in player_name_set:
+                items.append(self.combo_players.itemText(i))
+            else:
+                self.combo_players.removeItem(i)
+        items.reverse()
+
+        item_set = set(items)
+        for key in player_names:
+            if not key in item_set:
+                i = bisect.bisect(items, key)
+                items.insert(i, key)
+                self.combo_players.insertItem(i, key)
+
+    def populate_map_combobox(self):
+        for map in self.vr_.comp_engine.maps:
+            self.combo_maps.addItem(map)
+
+    # Updates the lobby based on players present
+    def update_lobby_widget(self):
+        # Reset rows for players that aren't in current lobby
+        for key in list(self.widget_map_lobby_players):
+            if not key in self.vr_.current_lobby:
+                self.widget_map_lobby_players.pop(key).reset()
+
+        # Bind free rows to players in lobby that don't have one yet
+        for key in self.vr_.current_lobby:
+            if not key in self.widget_map_lobby_players:
+                for widget in self.lobby_player_widgets:
+                    if widget.player_name is None:
+                        widget.bind(key)
+                        self.widget_map_lobby_players[key] = widget
+                        break
+
+        self.vr_.prioritize_lobby_icons()
+        self.sample_lobby_memory()
+
+    # Records live widget count and allocated memory, which should stay flat
+    # however many times players are added and cleared
+    def sample_lobby_memory(self):
+        if not self.vr_.profiler.is_enabled:
+            return
+
+        self.vr_.profiler.gauge("widgets", len(QApplication.allWidgets()))
+        self.vr_.profiler.gauge("allocated_blocks", sys.getallocatedblocks())
+
+
+class MainWindow(QWidget):
+    def __init__(self, vr):
+        super().__init__()
+        self.vr_ = vr  # Reference to main ValoRoulette class
+
+        self.layout_main = QStackedLayout()
+        with self.vr_.profiler.phase("LobbyWidget"):
+            self.widget_lobby = LobbyWidget(self.vr_)
+
+        self.layout_main.addWidget(self.widget_lobby)
+        self.setLayout(self.layout_main)
+        self.setMinimumWidth(700)
+        self.setWindowTitle("VALORANT Agent Roulette")
+
+
+class ValoRoulette(roulette_engine.RouletteEngine):
+    def __init__(self, profiler=None, seed=None, journal_path=None, voices=4, is_muted=False,
+                 history_path=None, is_anti_repeat_enabled=False, recency_decay=0.0):
+        self.profiler = profiler if profiler else profiling.Profiler(False)
+
+        # Player/lobby data
+        with self.profiler.phase("load_player_data"):
+            players = assets.load_player_store()
+        super().__init__(players, seed)
+
+        # Every wheel pick is logged, so a session can be checked afterwards
+        # with replay_journal.py
+        self.journal = journal.JournalWriter(
+            journal_path if journal_path is not None else assets.get_session_journal_path(self.seed), self.seed)
+
+        # Final results are kept across sessions, for stats
+        # (history_stats.py) and anti-repeat
+        with self.profiler.phase("load_history"):
+            self.history = history.RollHistory(
+                history_path if history_path is not None else assets.HISTORY_PATH)
+        self.is_anti_repeat_enabled = is_anti_repeat_enabled
+        self.set_recency_decay(recency_decay)
+        with self.profiler.phase("load_weapons"):
+            self.weapons = assets.load_weapons(assets.WEAPON_DATA_PATH)
+            self.loadouts = loadout.LoadoutTable(self.weapons)
+
+        # What each icon was loaded from, {(kind, name): (path, signature)}.
+        # Taken before loading, so a change while loading is still picked up
+        self.icon_sources = self.get_icon_sources()
+
+        # Icons in the atlas are ready straight away; the rest are decoded in
+        # the background and fill in as they arrive (see cb_icon_loaded)
+        self.agent_icons = {}
+        self.weapon_icons = {}
+        self.icons = {"agents": self.agent_icons,
+                      "weapons": self.weapon_icons}
+        with self.profiler.phase("request_icons"):
+            self.icon_loader = assets.IconLoader()
+            self.icon_loader.icon_loaded.connect(self.cb_icon_loaded)
+            for key in self.icon_sources:
+                self.request_icon(key)
+        with self.profiler.phase("load_comps"):
+            self.comp_engine = comp_engine.CompEngine(
+                assets.load_comps(assets.COMP_DATA_PATH))
+        with self.profiler.phase("load_sounds"):
+            self.sounds = assets.load_sounds(voices, self.profiler)
+            self.sounds["click"].is_muted = is_muted
+        self.spin_scheduler = SpinScheduler(self.profiler)
+
+        # Players, weapons, schema and icons are watched while the roulette
+        # is open, and changes applied in place (see reload_files)
+        self.file_watcher = file_watcher.FileWatcher(self.get_watched_paths())
+
+        # Time every pick when profiling
+        self.get_random_agent = self.profiler.wrap(
+            "get_random_agent", self.get_random_agent)
+
+        self.font_large = QFont("Segoe UI")
+        self.font_large.setPointSize(18)
+
+    # Requests an icon in the background; any current one is kept until the
+    # new one arrives
+    def request_icon(self, key):
+        width, height = ICON_SIZES[key[0]]
+        icon = self.icon_loader.request(
+            key, self.icon_sources[key][0], width, height, ICON_PRIORITIES[key[0]])
+        if icon is not None:
+            self.icons[key[0]][key[1]] = icon
+
+    def cb_icon_loaded(self, key, icon):
+        self.icons[key[0]][key[1]] = icon
+        if not self.icon_loader.is_loading():
+            self.profiler.mark("icons_loaded")
+
+    # Moves icons of agents the lobby players can roll to the front of the
+    # queue, while icons are still loading
+    def prioritize_lobby_icons(self):
+        if not self.icon_loader.is_loading():
+            return
+
+        self.icon_loader.prioritize(("agents", "Dealer"), ICON_PRIORITY_LOBBY)
+        for player_name in self.current_lobby:
+            for key in self.players[player_name].get_agent_names():
+                self.icon_loader.prioritize(
+                    ("agents", key), ICON_PRIORITY_LOBBY)
+
+    def close(self):
+        self.icon_loader.stop()
+        self.journal.close()
+        self.history.close()
+        self.players.close()
+
+    def get_data_paths(self):
+        return [assets.PLAYER_STORE_PATH, assets.PLAYER_STORE_PATH + "-wal",
+                assets.WEAPON_DATA_PATH, assets.SCHEMA_PATH]
+
+    # Data files, the icon manifest and every icon in it
+    def get_watched_paths(self):
+        return self.get_data_paths() + [assets.AGENT_ICON_DATA_PATH] + \
+            [self.icon_sources[key][0] for key in self.icon_sources]
+
+    def get_icon_sources(self):
+        icon_paths = assets.load_icon_paths(assets.AGENT_ICON_DATA_PATH)
+
+        icon_sources = {}
+        for kind in ICON_SIZES:
+            for key in icon_paths[kind]:
+                icon_sources[(kind, key)] = (
+                    icon_paths[kind][key], file_watcher.get_signature(icon_paths[kind][key]))
+
+        return icon_sources
+
+    # Applies changes to watched files (absolute 'paths'). Returns the set of
+    # 'players', 'weapons' and 'icons' that changed. Each kind reloads on its
+    # own, so one bad file doesn't hold back the rest; one that fails (e.g.
+    # caught half-written) is logged, left as it was and retried
+    def reload_files(self, paths):
+        start = time.perf_counter()
+        paths = set(paths)
+        store_paths = set(os.path.abspath(path) for path in self.get_data_paths()[:2])
+        weapon_path = os.path.abspath(assets.WEAPON_DATA_PATH)
+        schema_path = os.path.abspath(assets.SCHEMA_PATH)
+        # Anything else is the icon manifest or an icon
+        icon_paths = paths - store_paths - {weapon_path, schema_path}
+
+        reloads = [("schema", paths & {schema_path}, self.reload_schema),
+                   ("players", paths & store_paths, self.reload_players),
+                   ("weapons", paths & {weapon_path}, self.reload_weapons),
+                   ("icons", icon_paths, self.reload_icons)]
+        changed = set()
+        failed_paths = []
+        for name, reload_paths, reload in reloads:
+            if len(reload_paths) == 0:
+                continue
+
+            reload_start = time.perf_counter()
+            try:
+                if reload():
+                    changed.add(name)
+            except (OSError, ValueError, KeyError, sqlite3.Error) as error:
+                print("Couldn't reload %s: %s" % (name, error), file=sys.stderr)
+                self.profiler.record("reload_failed", time.perf_counter() - reload_start)
+                failed_paths += reload_paths
+
+        if len(failed_paths) > 0:
+            self.file_watcher.retry(failed_paths)
+        self.profiler.record("reload_files", time.perf_counter() - start)
+        return changed
+
+    # Interns any new agents. Returns False, as that changes nothing shown
+    def reload_schema(self):
+        player_model.load_agents(assets.SCHEMA_PATH)
+        return False
+
+    # Picks up players changed in the store by other programs (e.g. the
+    # editor). Lobby players that were removed leave the lobby; the rest keep
+    # their place and current agent. Returns True if anything was committed
+    def reload_players(self):
+        changed = self.players.reload()
+        if changed is None:
+            return False
+
+        for key in changed:
+            if not key in self.players:
+                self.remove_player_from_lobby(key)
+            elif key in self.current_lobby:
+                self.rebuild_player_index(key)
+
+        return True
+
+    # Updates weapons in place. Returns True if they changed
+    def reload_weapons(self):
+        weapons = assets.load_weapons(assets.WEAPON_DATA_PATH)
+        if weapons == self.weapons:
+            return False
+
+        loadouts = loadout.LoadoutTable(weapons)
+        self.weapons.clear()
+        self.weapons.update(weapons)
+        self.loadouts = loadouts
+
+        return True
+
+    # Requests only icons that are new or whose path or image changed, drops
+    # removed ones. Returns True if any did
+    def reload_icons(self):
+        icon_sources = self.get_icon_sources()
+        previous_sources = self.icon_sources
+        self.icon_sources = icon_sources
+        is_changed = False
+
+        for key in previous_sources:
+            if not key in icon_sources:
+                self.icon_loader.discard(key)
+                self.icons[key[0]].pop(key[1], None)
+                is_changed = True
+        for key in icon_sources:
+            if icon_sources[key] != previous_sources.get(key):
+                self.request_icon(key)
+                is_changed = True
+
+        self.file_watcher.set_paths(self.get_watched_paths())
+        return is_changed
+
+
+# Runs the roulette window. 'args' are valo_roulette.py's parsed arguments,
+# 'qt_args' any left over for Qt
+def run(args, qt_args):
+    profiler = profiling.Profiler(args.profile is not None)
+    app = QApplication(sys.argv[:1] + qt_args)
+    vr = ValoRoulette(profiler, args.seed, args.journal,
+                      args.voices, args.mute, args.history, args.no_repeat,
+                      args.recency_decay)
+    with profiler.phase("MainWindow"):
+        window = MainWindow(vr)
+
+    profiler.watch_first_paint(window)
+    window.show()
+    exit_code = app.exec()
+    vr.close()
+
+    profiler.save_report(args.profile)
+    return exit_code
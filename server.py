@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import urllib.parse
+
+import assets
+import loadout
+import player_model
+import roulette_engine
+import spin_timing
+
+# Events queued per subscriber before the oldest are dropped
+MAX_QUEUED_EVENTS = 64
+
+# Largest request body read; requests are small JSON objects
+MAX_BODY_BYTES = 16 * 1024
+
+
+# One lobby. Its engine only ever sees copies of its own players' records, so
+# lobbies never affect each other. A full lobby that has rolled takes ~40 KB,
+# over half of it the seeded random generators of its players' agent wheels
+# (dropped as players leave) and of the lobby and weapon wheels
+class Lobby:
+    def __init__(self, service, lobby_id, dealers_choice):
+        self.service_ = service
+        self.lobby_id = lobby_id
+
+        self.engine = roulette_engine.RouletteEngine({})
+        self.engine.is_dealers_choice_enabled = dealers_choice
+        self.primary = None
+        self.sidearm = None
+
+        # Event queues of 'events' subscribers, and running spins by kind
+        self.subscribers = set()
+        self.spin_tasks = {}
+
+    def add_player(self, player_name):
+        if not player_name in self.service_.players:
+            return 404, {"error": "Unknown player"}
+        if player_name in self.engine.current_lobby:
+            return 409, {"error": "Player already in lobby"}
+        if len(self.engine.current_lobby) >= roulette_engine.LOBBY_SIZE:
+            return 409, {"error": "Lobby is full"}
+
+        player = self.service_.players[player_name]
+        self.engine.players[player_name] = player_model.Player(
+            player.pool, "", player.listed, player.weights)
+        self.engine.add_player_to_lobby(player_name)
+        return 200, self.get_state()
+
+    def remove_player(self, player_name):
+        if not player_name in self.engine.current_lobby:
+            return 404, {"error": "Player not in lobby"}
+
+        self.engine.remove_player_from_lobby(player_name)
+        self.engine.players.pop(player_name)
+        self.engine.discard_stream("agent:" + player_name)
+        return 200, self.get_state()
+
+    def clear(self):
+        for player_name in self.engine.players:
+            self.engine.discard_stream("agent:" + player_name)
+        self.engine.clear_lobby()
+        self.engine.players.clear()
+        return 200, self.get_state()
+
+    # Gives every player a different agent (like 'Roll lobby')
+    def roll(self):
+        assignment = self.engine.roll_lobby()
+        if assignment is None:
+            return 409, {"error": "Can't give every player a different agent from their pool"}
+
+        self.start_spin("agents", self.get_agent_tick, {"agents": assignment})
+        return 200, {"agents": assignment}
+
+    # Rolls a primary and sidearm, or a loadout within 'credits' if given
+    def roll_weapons(self, credits):
+        weapons = self.service_.weapons
+        if credits is None:
+            self.primary = self.engine.get_random_weapon(
+                "primary", weapons["primary"], self.primary)
+            self.sidearm = self.engine.get_random_weapon(
+                "sidearm", weapons["sidearm"], self.sidearm)
+            result = {"primary": self.primary, "sidearm": self.sidearm}
+        else:
+            rolled = self.engine.roll_loadout(self.service_.loadouts, credits)
+            if rolled is None:
+                return 409, {"error": "No loadout fits the budget"}
+            cost, self.primary, self.sidearm, shields = rolled
+            result = {"cost": cost, "primary": self.primary,
+                      "sidearm": self.sidearm, "shields": shields}
+
+        self.start_spin("weapons", self.get_weapon_tick, result)
+        return 200, result
+
+    def get_agent_tick(self):
+        agents = {}
+        for player_name in self.engine.current_lobby:
+            agents[player_name] = self.engine.get_random_agent(player_name)
+
+        return {"agents": agents}
+
+    def get_weapon_tick(self):
+        weapons = self.service_.weapons
+        return {
+            "primary": self.engine.get_random_weapon("primary", weapons["primary"]),
+            "sidearm": self.engine.get_random_weapon("sidearm", weapons["sidearm"]),
+        }
+
+    def get_state(self):
+        return {
+            "id": self.lobby_id,
+            "players": list(self.engine.current_lobby),
+            "agents": {key: self.engine.current_lobby[key].selected for key in self.engine.current_lobby},
+            "dealers_choice": self.engine.is_dealers_choice_enabled,
+            "primary": self.primary,
+            "sidearm": self.sidearm,
+        }
+
+    # Streams a spin to subscribers: 'kind_tick' events with random picks as
+    # the wheel slows down, then a 'kind' event with the result. Nobody
+    # watching means nothing to spin
+    def start_spin(self, kind, get_tick, result):
+        if kind in self.spin_tasks:
+            self.spin_tasks.pop(kind).cancel()
+        if len(self.subscribers) == 0:
+            return
+
+        self.spin_tasks[kind] = asyncio.get_running_loop().create_task(
+            self.spin(kind, get_tick, result))
+
+    async def spin(self, kind, get_tick, result):
+        start = time.monotonic()
+        for i in range(spin_timing.SPIN_TICKS):
+            delay = start + self.service_.tick_times[i] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tick = get_tick()
+            tick["tick"] = i
+            self.publish(kind + "_tick", tick)
+
+        await asyncio.sleep(max(0, start + spin_timing.SPIN_SECONDS - time.monotonic()))
+        self.publish(kind, result)
+        self.spin_tasks.pop(kind, None)
+
+    # Queues an event for every subscriber, dropping their oldest if they're
+    # not keeping up
+    def publish(self, event, data):
+        message = ("event: %s\ndata: %s\n\n" % (event, json.dumps(data))).encode()
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def close(self):
+        for kind in self.spin_tasks:
+            self.spin_tasks[kind].cancel()
+        self.spin_tasks.clear()
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+
+# HTTP/JSON service holding many independent lobbies in memory:
+#   GET    /players                            player names
+#   POST   /lobbies                            new lobby ({"dealers_choice": bool})
+#   GET    /lobbies/ID                         lobby state
+#   DELETE /lobbies/ID                         close lobby
+#   POST   /lobbies/ID/players                 add player ({"name": name})
+#   DELETE /lobbies/ID/players/NAME            remove player
+#   POST   /lobbies/ID/clear                   clear lobby
+#   POST   /lobbies/ID/roll                    roll agents
+#   POST   /lobbies/ID/roll-weapons            roll weapons ({"credits": n} optional)
+#   GET    /lobbies/ID/events                  spin ticks and results (server-sent events)
+class RollService:
+    def __init__(self, max_lobbies):
+        self.players = assets.load_player_store()
+        self.weapons = assets.load_weapons(assets.WEAPON_DATA_PATH)
+        self.loadouts = loadout.LoadoutTable(self.weapons)
+        self.max_lobbies = max_lobbies
+
+        self.lobbies = {}
+        self.next_lobby_id = 1
+
+        # Same spin as the GUI
+        self.tick_times = spin_timing.get_tick_times()
+
+    async def cb_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if request_line == b"":
+                    break
+                method, target, version = request_line.decode(
+                    "latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, value = line.decode("latin-1").split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0"))
+                if length > MAX_BODY_BYTES:
+                    # The body is never read, so the connection can't be reused
+                    self.write_response(writer, 413, {"error": "Request body too large"}, True)
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length) if length > 0 else b""
+
+                parts = [urllib.parse.unquote(part) for part in urllib.parse.urlsplit(
+                    target).path.split("/") if part != ""]
+                if method == "GET" and len(parts) == 3 and parts[0] == "lobbies" and parts[2] == "events":
+                    await self.stream_events(parts[1], writer)
+                    break
+
+                try:
+                    request = json.loads(body) if len(body) > 0 else {}
+                    if not isinstance(request, dict):
+                        raise ValueError("Request body isn't a JSON object")
+                    status, response = self.route(method, parts, request)
+                except (ValueError, KeyError, TypeError, AttributeError, OverflowError):
+                    status, response = 400, {"error": "Bad request"}
+
+                is_closing = headers.get("connection", "").lower() == "close"
+                self.write_response(writer, status, response, is_closing)
+                await writer.drain()
+                if is_closing:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def write_response(self, writer, status, response, is_closing):
+        body = json.dumps(response).encode()
+        writer.write(("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%s\r\n" % (
+            status, STATUS_NAMES.get(status, ""), len(body),
+            "Connection: close\r\n" if is_closing else "")).encode() + body)
+
+    def route(self, method, parts, request):
+        if parts == ["players"] and method == "GET":
+            return 200, {"players": self.players.keys()}
+        if parts == ["lobbies"] and method == "POST":
+            return self.create_lobby(request.get("dealers_choice", False) == True)
+        if len(parts) < 2 or parts[0] != "lobbies":
+            return 404, {"error": "Not found"}
+        if not parts[1] in self.lobbies:
+            return 404, {"error": "Unknown lobby"}
+
+        lobby = self.lobbies[parts[1]]
+        action = parts[2] if len(parts) > 2 else None
+        if action is None and method == "GET":
+            return 200, lobby.get_state()
+        if action is None and method == "DELETE":
+            self.lobbies.pop(parts[1]).close()
+            return 200, {"id": parts[1]}
+        if action == "players" and method == "POST" and len(parts) == 3:
+            return lobby.add_player(request["name"])
+        if action == "players" and method == "DELETE" and len(parts) == 4:
+            return lobby.remove_player(parts[3])
+        if action == "clear" and method == "POST":
+            return lobby.clear()
+        if action == "roll" and method == "POST":
+            return lobby.roll()
+        if action == "roll-weapons" and method == "POST":
+            credits = request.get("credits")
+            return lobby.roll_weapons(None if credits is None else int(credits))
+
+        return 404, {"error": "Not found"}
+
+    def create_lobby(self, dealers_choice):
+        if len(self.lobbies) >= self.max_lobbies:
+            return 503, {"error": "Too many lobbies"}
+
+        lobby_id = str(self.next_lobby_id)
+        self.next_lobby_id += 1
+        self.lobbies[lobby_id] = Lobby(self, lobby_id, dealers_choice)
+        return 200, self.lobbies[lobby_id].get_state()
+
+    async def stream_events(self, lobby_id, writer):
+        if not lobby_id in self.lobbies:
+            self.write_response(writer, 404, {"error": "Unknown lobby"}, True)
+            await writer.drain()
+            return
+
+        lobby = self.lobbies[lobby_id]
+        queue = asyncio.Queue(MAX_QUEUED_EVENTS)
+        lobby.subscribers.add(queue)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                writer.write(message)
+                await writer.drain()
+        finally:
+            lobby.subscribers.discard(queue)
+
+
+STATUS_NAMES = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                409: "Conflict", 413: "Content Too Large", 503: "Service Unavailable"}
+
+
+async def serve(args):
+    service = RollService(args.max_lobbies)
+    server = await asyncio.start_server(service.cb_connection, args.host, args.port,
+                                        backlog=args.backlog)
+    print("Serving on http://%s:%d" % (args.host, args.port), file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-lobbies", type=int, default=10000,
+                        help="refuse new lobbies past this many (default: 10000)")
+    parser.add_argument("--backlog", type=int, default=1024,
+                        help="pending connection queue size (default: 1024)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import math
+
+
+# A spin ticks SPIN_TICKS times over SPIN_SECONDS, its position following an
+# OutQuad easing curve (fast at first, then slowing down). Shared by the GUI
+# and the roll service so both spin the same
+SPIN_TICKS = 30
+SPIN_SECONDS = 5.0
+
+
+# Returns the seconds into the spin of each tick, then of the end of the spin.
+# OutQuad is 1 - (1 - t)^2, so the curve reaches i / SPIN_TICKS at
+# t = 1 - sqrt(1 - i / SPIN_TICKS)
+def get_tick_times():
+    tick_times = []
+    for i in range(SPIN_TICKS):
+        tick_times.append(
+            SPIN_SECONDS * (1 - math.sqrt(1 - i / SPIN_TICKS)))
+    tick_times.append(SPIN_SECONDS)
+
+    return tick_times
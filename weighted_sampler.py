@@ -0,0 +1,62 @@
+# Fenwick (binary indexed) tree over integer weights. Setting a weight, a
+# prefix sum and finding the index a draw lands on are each O(log n), so a
+# pool's weights can change between draws (agents taken and freed mid-spin)
+# without rebuilding anything. Weights are integers so a draw is one
+# randrange over whole units, which a journal can log and replay exactly
+class FenwickSampler:
+    def __init__(self, weights):
+        self.weights = list(weights)
+        self.total = sum(self.weights)
+
+        # tree[i] (1-based) holds the sum of the weights in (i - lowbit(i), i]
+        self.tree = [0] + self.weights
+        for i in range(1, len(self.tree)):
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+        # Highest power of two that's a valid index, where find() starts
+        self.top = 1 << (len(self.weights).bit_length() - 1) if len(self.weights) > 0 else 0
+
+    def __len__(self):
+        return len(self.weights)
+
+    def get_weight(self, index):
+        return self.weights[index]
+
+    def set_weight(self, index, weight):
+        delta = weight - self.weights[index]
+        if delta == 0:
+            return
+
+        self.weights[index] = weight
+        self.total += delta
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    # Returns the sum of the weights before 'index'
+    def get_prefix(self, index):
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+
+        return total
+
+    # Returns the index whose share of [0, total) 'value' falls in, i.e. the
+    # first index whose running sum is greater than 'value'
+    def find(self, value):
+        tree = self.tree
+        size = len(tree)
+        index = 0
+        step = self.top
+        while step:
+            next_index = index + step
+            if next_index < size and tree[next_index] <= value:
+                index = next_index
+                value -= tree[index]
+            step >>= 1
+
+        return index